@@ -174,6 +174,8 @@ async def main(args: argparse.Namespace) -> None:
         logging.info("System exit triggered. Shutting down.")
         return
     finally:
+        # Note: even with --no-vox, since other modules may have created the client on demand
+        await voximplant.close()
         await db.DatabaseApi().dispose()
 
 
@@ -184,6 +186,15 @@ if __name__ == "__main__":
     
     args: argparse.Namespace = parser.parse_args()
     
+    # Must be done before the loop is created. uvloop isn't available on Windows
+    if sys.platform != "win32":
+        try:
+            import uvloop
+        except ImportError:
+            logging.warning("uvloop not installed, using the default event loop.")
+        else:
+            uvloop.install()
+    
     # Note: not `asyncio.run` because see here: https://stackoverflow.com/questions/65682221
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
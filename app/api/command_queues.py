@@ -1,4 +1,5 @@
 import asyncio
+import collections
 import typing
 import uuid
 
@@ -6,9 +7,37 @@ from aiohttp import web
 
 # Separated from commands dispatcher due to cyclic import errors =(
 
+
+class CommandQueue:
+    """
+    A minimal single-consumer replacement for `asyncio.Queue`.
+    
+    Commands are put by Telegram handlers and read by a single `process_tg_queue` task per call,
+    so none of the bookkeeping of `asyncio.Queue` (size limits, task tracking, multiple getters) is needed.
+    """
+
+    def __init__(self) -> None:
+        self._items: collections.deque[typing.Any] = collections.deque()
+        self._not_empty: asyncio.Event = asyncio.Event()
+
+    def put_nowait(self, item: typing.Any) -> None:
+        self._items.append(item)
+        self._not_empty.set()
+
+    async def put(self, item: typing.Any) -> None:
+        self.put_nowait(item)
+
+    async def get(self) -> typing.Any:
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        return self._items.popleft()
+
+
 # Command queues for each call for getting commands from Telegram bot
 # Behaving like a websocket, provides a uniform interface for receiving commands from all clients
-tg_call_commands_queues: typing.Dict[uuid.UUID, asyncio.Queue] = {}
+tg_call_commands_queues: typing.Dict[uuid.UUID, CommandQueue] = {}
 
 # List of clients websockets for each call
 client_websockets: typing.Dict[uuid.UUID, typing.List[web.WebSocketResponse]] = {}
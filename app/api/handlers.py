@@ -81,7 +81,7 @@ async def call_from_voximplant(request: web_request.Request) -> web.Response:
         await common.send_push_to_user(f"Входящий звонок от {caller_number}", user)
 
         # Create it here as Telegram bot is allowed to put messages to it right on the following line :)
-        command_dispatcher.tg_call_commands_queues[call.uid] = asyncio.Queue()
+        command_dispatcher.tg_call_commands_queues[call.uid] = command_dispatcher.CommandQueue()
 
         await tg_start_dialog(
             telegram_id=user.telegram_id,
@@ -140,7 +140,7 @@ async def auth_request(request: web_request.Request) -> web.Response:
         
         if config.BRANCH == "master":
             logging.info(f"Verification code for {phone} is {new_code.code}")
-            await voximplant.client.send_sms_message(
+            await voximplant.get_client().send_sms_message(
                 config.VOX_MAIN_NUMBER,
                 phone,
                 f"Ваш код подтверждения Busy: {new_code.code}",
@@ -287,7 +287,7 @@ async def send_sms(request: web_request.Request, user_id: int) -> web.Response:
                              )
 
         session.add(sms)
-        await voximplant.client.send_sms_message(user.given_phone, dest_phone, message)
+        await voximplant.get_client().send_sms_message(user.given_phone, dest_phone, message)
         await common.handle_advance_service(user.id, charge_msg=True)
         return responses.success(result="ok")
 
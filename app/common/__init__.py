@@ -11,7 +11,10 @@ from types import MappingProxyType
 import re
 import enum
 
+import cachetools
 import sqlalchemy
+import sqlalchemy.event
+import sqlalchemy.orm
 from sqlalchemy.ext.asyncio import AsyncSession
 import aiogram.utils.exceptions as aiogram_exceptions
 
@@ -328,6 +331,7 @@ async def activate_plan(
         payment_id=payment_id,
     )
     session.add(new_active_plan)
+    invalidate_call_user_status(user)
 
     return billing_period_end
 
@@ -371,6 +375,7 @@ async def unsubscribe(user: db.User, *, reclaim_number: bool = False, cancel_act
 
     # Delete all active plans
     await session.execute(sqlalchemy.delete(db.ActivePlan).where(db.ActivePlan.user == user))
+    invalidate_call_user_status(user)
 
 
 async def change_subscription(
@@ -447,7 +452,7 @@ async def assign_virtual_number(user: db.User) -> str | None:
     import config
 
     if config.BRANCH == 'master':
-        buy_number_data = await voximplant.client.buy_new_number()
+        buy_number_data = await voximplant.get_client().buy_new_number()
 
         if buy_number_data is not None:
             new_number = buy_number_data[0]
@@ -457,6 +462,7 @@ async def assign_virtual_number(user: db.User) -> str | None:
                          and monthly price = {monthly_price}')
 
             user.given_phone = new_number
+            invalidate_call_user_status(user)
             # await session.commit()
             return new_number
         else:
@@ -465,6 +471,7 @@ async def assign_virtual_number(user: db.User) -> str | None:
     elif config.BRANCH == 'test':
         # Mocking
         user.given_phone = config.VOX_MAIN_NUMBER
+        invalidate_call_user_status(user)
         return config.VOX_MAIN_NUMBER
     else:
         return ''
@@ -807,7 +814,7 @@ async def get_transcript_commands(callback: dict) -> None:
 
     record_url = transcript_data.get('record_url')
 
-    transcript_text = await voximplant.client.get_transcript(session_id=session_id)
+    transcript_text = await voximplant.get_client().get_transcript(session_id=session_id)
 
     commands: list = await transform_transcript_to_messages(transcript_text, session_id)
 
@@ -899,6 +906,82 @@ async def _do_save_call_recording(call_id: str | uuid.UUID, recording_url: str)
         call.recording_url = public_url
 
 
+@dataclasses.dataclass(frozen=True)
+class CallUserStatus:
+    has_active_plans: bool
+    has_given_phone: bool
+
+
+# telegram_id -> CallUserStatus, for the incoming call messages, which are sent for every call.
+# Invalidated once changes to active plans or the given phone are committed, the TTL is just a safety net.
+_call_user_status_cache: cachetools.TTLCache = cachetools.TTLCache(maxsize=4096, ttl=60)
+# Bumped on every committed invalidation, so that a lookup that raced with the commit doesn't cache its result
+_call_user_status_epoch: int = 0
+# Session.info key for the telegram ids to invalidate once the session commits
+_PENDING_CALL_USER_STATUS_KEY: str = "pending_call_user_status_invalidations"
+
+
+def invalidate_call_user_status(user: db.User) -> None:
+    """
+    Drops the user's cached status once the current session commits.
+    Must be called within a `db_api.session()` context.
+    """
+    
+    if user.telegram_id is None:
+        return
+    
+    # Note: also dropped right away, so that lookups within this session don't see the old status
+    _call_user_status_cache.pop(user.telegram_id, None)
+    db.DatabaseApi().cur_session.info.setdefault(_PENDING_CALL_USER_STATUS_KEY, set()).add(user.telegram_id)
+
+
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, "after_commit")
+def _invalidate_committed_call_user_statuses(session: sqlalchemy.orm.Session) -> None:
+    global _call_user_status_epoch
+    
+    telegram_ids: set[str] | None = session.info.pop(_PENDING_CALL_USER_STATUS_KEY, None)
+    if not telegram_ids:
+        return
+    
+    _call_user_status_epoch += 1
+    for telegram_id in telegram_ids:
+        _call_user_status_cache.pop(telegram_id, None)
+
+
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, "after_rollback")
+def _discard_rolled_back_call_user_statuses(session: sqlalchemy.orm.Session) -> None:
+    # Note: a lookup within the session may have cached the status with the discarded changes
+    for telegram_id in session.info.pop(_PENDING_CALL_USER_STATUS_KEY, ()):
+        _call_user_status_cache.pop(telegram_id, None)
+
+
+async def get_call_user_status(telegram_id: str) -> CallUserStatus | None:
+    """
+    Returns a (briefly cached) summary of what the user has, or None if there's no such user.
+    Opens a database session, if necessary.
+    """
+    
+    status: CallUserStatus | None = _call_user_status_cache.get(telegram_id)
+    if status is not None:
+        return status
+    
+    epoch: int = _call_user_status_epoch
+    
+    async with db.DatabaseApi().session(allow_reuse=True):
+        user: db.User | None = await db.DatabaseApi().find_user(telegram_id=telegram_id)
+        if user is None:
+            return None
+        
+        status = CallUserStatus(
+            has_active_plans=len(user.active_plans) > 0,
+            has_given_phone=user.given_phone != "",
+        )
+    
+    if epoch == _call_user_status_epoch:
+        _call_user_status_cache[telegram_id] = status
+    return status
+
+
 async def get_user_config(user: db.User) -> typing.Mapping[str, typing.Any]:
     """
     Returns a read-only proxy to the user's preferences.
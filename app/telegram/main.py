@@ -8,17 +8,20 @@ import asyncio
 
 from pydub import AudioSegment
 import json
+import orjson
 import os
 import traceback
 from datetime import datetime
 import logging
+import time
 import uuid
 import warnings
 import contextlib
 import dataclasses
+import functools
 import io
-import itertools
 import phonenumbers
+import cachetools
 
 from pymorphy2 import MorphAnalyzer
 from aiogram import Bot, Dispatcher, types
@@ -54,6 +57,28 @@ storage: BaseStorage
 bot: Bot
 dp: Dispatcher
 locks: typing.Dict[str, asyncio.Lock]
+# Shared by all outgoing HTTP requests (call recordings, logging), to reuse connections
+http_session: aiohttp.ClientSession
+
+# Keyboards without any per-user state, so they are built once and shared by all handlers
+_KB_MAIN_WITH_NUMBER: typing.Final[ReplyKeyboardMarkup] = kb_main_with_number()
+_KB_MAIN_WITHOUT_NUMBER: typing.Final[ReplyKeyboardMarkup] = kb_main_without_number()
+_KB_CANCEL: typing.Final[ReplyKeyboardMarkup] = kb_cancel()
+_IKB_CONFIRM: typing.Final[InlineKeyboardMarkup] = ikb_confirm()
+_IKB_CALL_BACK: typing.Final[InlineKeyboardMarkup] = ikb_call_back()
+_IKB_TURN_OFF_BUSY: typing.Final[InlineKeyboardMarkup] = ikb_turn_off_busy()
+
+
+# Only 4 possible combinations, so might as well keep all of them
+@functools.lru_cache(maxsize=4)
+def _ikb_setting_cached(with_number: bool, extra_autocharge: bool) -> InlineKeyboardMarkup:
+    return ikb_setting(with_number=with_number, extra_autocharge=extra_autocharge)
+
+
+# Rendered on every call transcript refresh
+@functools.lru_cache(maxsize=2)
+def _ikb_incoming_call_cached(with_write_answer: bool) -> InlineKeyboardMarkup:
+    return ikb_incoming_call(with_write_answer=with_write_answer)
 
 
 class _DispatcherLogFilter:
@@ -85,7 +110,7 @@ class _DispatcherLogFilter:
 async def run() -> None:
     async with contextlib.AsyncExitStack() as stack:
         import config
-        global storage, bot, dp, locks
+        global storage, bot, dp, locks, http_session
 
         if config.TELEGRAM_BOT_SECRET is None:
             logging.error("No Telegram bot token specified. Stopping.")
@@ -101,6 +126,18 @@ async def run() -> None:
         bot = Bot(config.TELEGRAM_BOT_SECRET, parse_mode='HTML')
         stack.push_async_callback(bot.close)
 
+        # Sized for bursts of simultaneously finished calls, each downloading its recording
+        http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=200,
+                limit_per_host=50,
+                ttl_dns_cache=300,
+                enable_cleanup_closed=True,
+            ),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+        stack.push_async_callback(http_session.close)
+
         locks = {}
         dp = Dispatcher(bot, storage=storage)
         stack.push_async_callback(dp.wait_closed)
@@ -289,6 +326,45 @@ class MultipleCallSynchronizationData:
         )
 # endregion synchronization struct
 
+# The event loop only keeps weak references to tasks, so fire-and-forget ones have to be stored somewhere
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _on_background_task_done(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+
+    if task.cancelled() or task.exception() is None:
+        return
+
+    # Mirrors errors_handler, which these exceptions never reach
+    error: BaseException = task.exception()
+    if isinstance(error, aiogram.exceptions.TelegramAPIError):
+        logging.info("TelegramAPIError in background task", extra=dict(error=traceback.format_exception(error)))
+    else:
+        logging.error("Background task failed", extra=dict(error=traceback.format_exception(error)))
+
+
+def _fire(coro: typing.Coroutine) -> asyncio.Task:
+    """
+    Runs the coroutine in the background, for when the handler doesn't depend on its completion
+    (e.g. cleaning up messages).
+    """
+
+    task: asyncio.Task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_background_task_done)
+    return task
+
+
+async def _delete_later(message: types.Message, delay: float) -> None:
+    """
+    Deletes a temporary notice after `delay` seconds. Meant to be run via `_fire()`.
+    """
+
+    await asyncio.sleep(delay)
+    await message.delete()
+
+
 async def get_user(obj: types.Message | types.CallbackQuery | int, *,
                    must_exist: bool = True,
                    **kwargs) -> db.User | None:
@@ -487,22 +563,21 @@ async def start_command(message: types.Message, state: FSMContext):
 
             import config
             if config.BRANCH == 'master':
-                async with aiohttp.ClientSession() as client_session:
-                    username = message.from_user.username
-                    if username is None or username == '':
-                        fullname = message.from_user.full_name
-                        body = {'username': fullname}
-                    else:
-                        body = {'username': f'@{username}'}
-
-                    api_key = config.API_KEY
-                    headers = {"Content-Type": "application/json; charset=utf-8"}
-                    async with client_session.post(
-                        url=f'https://test.busy.contact/logs/users?apiKey={api_key}', headers=headers,
-                        data=json.dumps(body)
-                        ) as r:
-                        if r.status != 200:
-                            logging.error("Unsuccessful post-request about new user")
+                username = message.from_user.username
+                if username is None or username == '':
+                    fullname = message.from_user.full_name
+                    body = {'username': fullname}
+                else:
+                    body = {'username': f'@{username}'}
+
+                api_key = config.API_KEY
+                headers = {"Content-Type": "application/json; charset=utf-8"}
+                async with http_session.post(
+                    url=f'https://test.busy.contact/logs/users?apiKey={api_key}', headers=headers,
+                    data=json.dumps(body)
+                    ) as r:
+                    if r.status != 200:
+                        logging.error("Unsuccessful post-request about new user")
 
             try:
                 amo_contact_object = amoCRM.entities.get_contact_object(
@@ -530,9 +605,9 @@ async def start_command(message: types.Message, state: FSMContext):
             given_phone = user.given_phone
             reply_markup: ReplyKeyboardMarkup
             if given_phone == "":
-                reply_markup = kb_main_without_number()
+                reply_markup = _KB_MAIN_WITHOUT_NUMBER
             else:
-                reply_markup = kb_main_with_number()
+                reply_markup = _KB_MAIN_WITH_NUMBER
             await answer_message(
                 message, text=texts.ALREADY_REGISTERED,
                 reply_markup=reply_markup
@@ -664,7 +739,7 @@ async def get_number_handler(message: types.Message, state: FSMContext):
 
 @postponed(Dispatcher.message_handler, state=Registration.GetNumber)
 async def wrong_get_number(message: types.Message, state: FSMContext):
-    if message.text[0] == '/':
+    if message.text and message.text.startswith('/'):
         await answer_message(message, "Пока вы не можете пользоваться командами")
     await message.delete()
 
@@ -741,8 +816,8 @@ async def help_tariff_info_handler(callback: types.CallbackQuery, state: FSMCont
     ib_choose_tariff = InlineKeyboardButton(text="Выбрать тариф 💳", callback_data="Choose tariff")
     ikb.add(ib_choose_tariff)
     edited_msg = await callback.message.edit_text(text=texts.Help.TARIFF_INFO, reply_markup=ikb)
-    await record_message(edited_msg, callback.message)
-    await callback.answer()
+    # Recording only touches the database, so it can overlap with the Telegram round-trip
+    await asyncio.gather(record_message(edited_msg, callback.message), callback.answer())
 
 
 @postponed(Dispatcher.callback_query_handler, text='Help Tariff Info')
@@ -751,8 +826,7 @@ async def help_tariff_info_handler(callback: types.CallbackQuery, state: FSMCont
     ib_change_tariff = InlineKeyboardButton(text="Сменить тариф 💳", callback_data="Change tariff")
     ikb.add(ib_change_tariff)
     edited_msg = await callback.message.edit_text(text=texts.Help.TARIFF_INFO, reply_markup=ikb)
-    await record_message(edited_msg, callback.message)
-    await callback.answer()
+    await asyncio.gather(record_message(edited_msg, callback.message), callback.answer())
 
 
 # @postponed(Dispatcher.callback_query_handler, text='Help Redirection', state=[None, Registration.Onboarding])
@@ -781,7 +855,7 @@ async def help_tariff_info_handler(callback: types.CallbackQuery, state: FSMCont
 
 @postponed(Dispatcher.message_handler, state=Registration.Onboarding)
 async def error_choose_tariff_command(message: types.Message):
-    if message.text[0] == '/':
+    if message.text and message.text.startswith('/'):
         await answer_message(message, "Пока вы не можете пользоваться этой командой\nВыберите тариф")
     await message.delete()
 
@@ -836,7 +910,7 @@ async def tariff_handler_common(callback: types.CallbackQuery, state: FSMContext
             logging.warning("AmoCRM error", exc_info=True)
 
         if user.subscription_id == plan_id:
-            kb = kb_main_with_number() if user.given_phone != "" else kb_main_without_number()
+            kb = _KB_MAIN_WITH_NUMBER if user.given_phone != "" else _KB_MAIN_WITHOUT_NUMBER
             await answer_message(
                 callback.message,
                 text=f"У вас уже подключен {plan_name}\n"
@@ -933,7 +1007,7 @@ async def tariff_handler_confirm(callback: types.CallbackQuery, state: FSMContex
 
                     logging.info(f"virtual number is {virt_number}")
 
-                    kb = kb_main_with_number() if virt_number != "" else kb_main_without_number()
+                    kb = _KB_MAIN_WITH_NUMBER if virt_number != "" else _KB_MAIN_WITHOUT_NUMBER
                     await answer_message(
                         callback.message, text=f"Вы успешно приобрели тариф \"{plan_name}\"",
                         reply_markup=kb
@@ -978,18 +1052,17 @@ async def successful_subscription(telegram_id: str, plan_id: int, virt_number: s
     try:
         import config
         if config.BRANCH == 'master':
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    url=f'https://test.busy.contact/logs/users/subscribe?apiKey={config.API_KEY}',
-                    headers={"Content-Type": "application/json; charset=utf-8"},
-                    data=json.dumps({'username': f'Пользователь {telegram_id}'})
-                ) as r:
-                    if r.status != 200:
-                        logging.error("unsuccessful post-request about subscription")
+            async with http_session.post(
+                url=f'https://test.busy.contact/logs/users/subscribe?apiKey={config.API_KEY}',
+                headers={"Content-Type": "application/json; charset=utf-8"},
+                data=json.dumps({'username': f'Пользователь {telegram_id}'})
+            ) as r:
+                if r.status != 200:
+                    logging.error("unsuccessful post-request about subscription")
     except Exception:
         logging.exception('error while notifying about subscription')
 
-    kb = kb_main_with_number() if virt_number != "" else kb_main_without_number()
+    kb = _KB_MAIN_WITH_NUMBER if virt_number != "" else _KB_MAIN_WITHOUT_NUMBER
     await send_message(
         chat_id=telegram_id, text=f"Вы успешно приобрели тариф \"{plan_name}\"",
         reply_markup=kb
@@ -1269,15 +1342,15 @@ async def outgoing_call_command(message: types.Message, state: FSMContext):
 
     await ProfileCall.GetCallNumber.set()
     await message.delete()
-    await answer_message(message, text=texts.OUTBOUND_CALL_ADDRESS, reply_markup=kb_cancel())
+    await answer_message(message, text=texts.OUTBOUND_CALL_ADDRESS, reply_markup=_KB_CANCEL)
 
 
 @postponed(
     Dispatcher.message_handler, Text(equals='Отмена ◀️'), state=[ProfileCall.GetCallNumber, ProfileCall.GetConfirm]
     )
 async def cancel_handler(message: types.Message, state: FSMContext):
-    await answer_message(message, text="Отменено", reply_markup=kb_main_with_number())
-    await message.delete()
+    await answer_message(message, text="Отменено", reply_markup=_KB_MAIN_WITH_NUMBER)
+    _fire(message.delete())
     await state.finish()
 
 
@@ -1289,7 +1362,7 @@ async def get_number(message: types.Message, state: FSMContext):
         await answer_message(
             message,
             text=f"Вы хотите позвонить на номер: {prettify_number(number)}?",
-            reply_markup=ikb_confirm()
+            reply_markup=_IKB_CONFIRM
             )
         await message.delete()
         await ProfileCall.next()
@@ -1303,7 +1376,7 @@ async def get_number(message: types.Message, state: FSMContext):
         if number.isdigit() and len(number) == 11:
             await answer_message(
                 message, text=f"Вы хотите позвонить на номер: {prettify_number(number)}?",
-                reply_markup=ikb_confirm()
+                reply_markup=_IKB_CONFIRM
                 )
             await message.delete()
             await ProfileCall.next()
@@ -1324,11 +1397,11 @@ async def start_outbound_call(callback: types.CallbackQuery, destination: str) -
             return
 
         if not (await common.bill(user, charge_call=True)):
-            await answer_message(callback.message, text=texts.NO_AVAILABLE_CALLS, reply_markup=kb_main_with_number())
+            await answer_message(callback.message, text=texts.NO_AVAILABLE_CALLS, reply_markup=_KB_MAIN_WITH_NUMBER)
             return
 
         call_id = uuid.uuid4()
-        outbound_call_data = await voximplant.client.start_outbound_call(
+        outbound_call_data = await voximplant.get_client().start_outbound_call(
             caller=own_phone,
             destination=destination,
             voximplant_number=given_phone,
@@ -1400,28 +1473,27 @@ async def finish_outbound_call(call_id: uuid, telegram_id: str, commands: list,
 
         # message_id = call_object.tg_message_id
         # await bot.delete_message(chat_id=telegram_id, message_id=message_id)
-        await send_message(chat_id=telegram_id, text=text_message, reply_markup=ikb_call_back())
+        await send_message(chat_id=telegram_id, text=text_message, reply_markup=_IKB_CALL_BACK)
         await send_audio_dialog(telegram_id, record, number)
 
     await state.finish()
 
 
 async def send_audio_dialog(telegram_id: str, url: str, number: str):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            voice = await response.read()
-            async with aiofiles.open(f'voice_{telegram_id}-{number}.mp3', 'wb+') as f:
-                await f.write(voice)
-                voice = AudioSegment.from_mp3(f.name).export(
-                    f'voice_{telegram_id}-{number}.ogg',
-                    format='ogg', codec="libopus"
-                    )
-                await bot.send_audio(
-                    chat_id=telegram_id, audio=voice, caption=f'Запись звонка. Номер собеседника: '
-                                                              f'{number}'
-                    )
-            os.remove(f'voice_{telegram_id}-{number}.mp3')
-            os.remove(f'voice_{telegram_id}-{number}.ogg')
+    async with http_session.get(url) as response:
+        voice = await response.read()
+        async with aiofiles.open(f'voice_{telegram_id}-{number}.mp3', 'wb+') as f:
+            await f.write(voice)
+            voice = AudioSegment.from_mp3(f.name).export(
+                f'voice_{telegram_id}-{number}.ogg',
+                format='ogg', codec="libopus"
+                )
+            await bot.send_audio(
+                chat_id=telegram_id, audio=voice, caption=f'Запись звонка. Номер собеседника: '
+                                                          f'{number}'
+                )
+        os.remove(f'voice_{telegram_id}-{number}.mp3')
+        os.remove(f'voice_{telegram_id}-{number}.ogg')
 
 
 @postponed(Dispatcher.callback_query_handler, text='Yes', state=ProfileCall.GetConfirm)
@@ -1433,7 +1505,7 @@ async def yes_handler(callback: types.CallbackQuery, state: FSMContext):
 
         await answer_message(
             callback.message, text=f'Отлично, звоним на номер {prettify_number(number_to_call)}',
-            reply_markup=kb_main_with_number()
+            reply_markup=_KB_MAIN_WITH_NUMBER
             )
 
         await start_outbound_call(callback=callback, destination=data['number'])
@@ -1445,16 +1517,16 @@ async def yes_handler(callback: types.CallbackQuery, state: FSMContext):
 @postponed(Dispatcher.callback_query_handler, text='Change', state=ProfileCall.GetConfirm)
 async def change_handler(callback: types.CallbackQuery):
     await answer_message(callback.message, text='Введите номер еще раз')
-    await callback.message.delete()
+    _fire(callback.message.delete())
     await ProfileCall.GetCallNumber.set()
     await callback.answer()
 
 
 @postponed(Dispatcher.message_handler, state=ProfileCall.GetConfirm)
 async def get_confirm_handler(message: types.Message):
-    if message.text[0] == '/':
+    if message.text and message.text.startswith('/'):
         await answer_message(message, "Пока вы не можете пользоваться командами")
-    await message.delete()
+    _fire(message.delete())
 
 
 @postponed(Dispatcher.message_handler, commands=['sms'])
@@ -1470,13 +1542,13 @@ async def outgoing_call_command(message: types.Message):
     else:
         await ProfileSendMessage.GetMessageNumber.set()
         await message.delete()
-        await answer_message(message, text=texts.SMS_ADDRESS, reply_markup=kb_cancel())
+        await answer_message(message, text=texts.SMS_ADDRESS, reply_markup=_KB_CANCEL)
 
 
 @postponed(Dispatcher.message_handler, Text(equals='Отмена ◀️'), state=ProfileSendMessage.all_states)
 async def cancel_handler(message: types.Message, state: FSMContext):
-    await answer_message(message, text="Отменено", reply_markup=kb_main_with_number())
-    await message.delete()
+    await answer_message(message, text="Отменено", reply_markup=_KB_MAIN_WITH_NUMBER)
+    _fire(message.delete())
     await state.finish()
 
 
@@ -1490,7 +1562,7 @@ async def get_number(message: types.Message, state: FSMContext):
 
         await answer_message(
             message, text=f"Вы хотите отправить сообщение на номер: {prettify_number(number)}?",
-            reply_markup=ikb_confirm()
+            reply_markup=_IKB_CONFIRM
             )
         await message.delete()
         await ProfileSendMessage.next()
@@ -1505,7 +1577,7 @@ async def get_number(message: types.Message, state: FSMContext):
         if number.isdigit() and len(number) == 11:
             await answer_message(
                 message, text=f"Вы хотите отправить сообщение на номер: {prettify_number(number)}?",
-                reply_markup=ikb_confirm()
+                reply_markup=_IKB_CONFIRM
                 )
             await message.delete()
             await ProfileSendMessage.next()
@@ -1521,15 +1593,14 @@ async def yes_handler(callback: types.CallbackQuery, state: FSMContext):
             text=f"Сообщение будет отправлено на номер: {data['number']}\n"
                  f"Введите текст сообщения"
             )
-        await record_message(edited_msg, callback.message)
         await ProfileSendMessage.next()
-        await callback.answer()
+        await asyncio.gather(record_message(edited_msg, callback.message), callback.answer())
 
 
 @postponed(Dispatcher.callback_query_handler, text='Change', state=ProfileSendMessage.GetConfirmNumber)
 async def change_handler(callback: types.CallbackQuery):
     await answer_message(callback.message, text='Введите номер еще раз')
-    await callback.message.delete()
+    _fire(callback.message.delete())
     await ProfileSendMessage.GetMessageNumber.set()
     await callback.answer()
 
@@ -1540,7 +1611,7 @@ async def get_number(message: types.Message, state: FSMContext):
     await ProfileSendMessage.next()
     async with state.proxy() as data:
         data['message'] = message.text
-        await answer_message(message, text='Ваше сообщение:\n' + data['message'], reply_markup=ikb_confirm())
+        await answer_message(message, text='Ваше сообщение:\n' + data['message'], reply_markup=_IKB_CONFIRM)
 
 
 @postponed(Dispatcher.callback_query_handler, text='Yes', state=ProfileSendMessage.GetConfirmMessage)
@@ -1554,7 +1625,7 @@ async def yes_handler(callback: types.CallbackQuery, state: FSMContext):
             user_id = user.id
 
         if billed:
-            await voximplant.client.send_sms_message(
+            await voximplant.get_client().send_sms_message(
                 source=given_phone,
                 destination=data['number'],
                 sms_body=data['message']
@@ -1564,11 +1635,11 @@ async def yes_handler(callback: types.CallbackQuery, state: FSMContext):
             await answer_message(
                 callback.message, text=f"Сообщение отправлено на номер: {data['number']}.\n"
                                        f"Текст сообщения: {data['message']}",
-                reply_markup=kb_main_with_number()
+                reply_markup=_KB_MAIN_WITH_NUMBER
                 )
         else:
             await callback.message.delete()
-            await answer_message(callback.message, text=texts.NO_AVAILABLE_SMS, reply_markup=kb_main_with_number())
+            await answer_message(callback.message, text=texts.NO_AVAILABLE_SMS, reply_markup=_KB_MAIN_WITH_NUMBER)
 
         await common.handle_advance_service(user_id, charge_msg=True)
 
@@ -1579,7 +1650,7 @@ async def yes_handler(callback: types.CallbackQuery, state: FSMContext):
 @postponed(Dispatcher.callback_query_handler, text='Change', state=ProfileSendMessage.GetConfirmMessage)
 async def change_handler(callback: types.CallbackQuery):
     await answer_message(callback.message, text='Введите текст сообщения еще раз')
-    await callback.message.delete()
+    _fire(callback.message.delete())
     await ProfileSendMessage.GetMessage.set()
     await callback.answer()
 
@@ -1588,9 +1659,42 @@ async def change_handler(callback: types.CallbackQuery):
     Dispatcher.message_handler, state=[ProfileSendMessage.GetConfirmNumber, ProfileSendMessage.GetConfirmMessage]
     )
 async def get_confirm_handler(message: types.Message):
-    if message.text[0] == '/':
+    if message.text and message.text.startswith('/'):
         await answer_message(message, "Пока вы не можете пользоваться командами")
-    await message.delete()
+    _fire(message.delete())
+
+
+def _render_tariff_text(user: db.User, active_plans: typing.Sequence[db.ActivePlan]) -> str:
+    """
+    Describes the user's current tariff and what's left of their active plans.
+    """
+
+    parts: list[str] = []
+
+    if len(active_plans) > 0:
+        for active_plan in active_plans:
+            active_plan_end = active_plan.end.strftime('%Y-%m-%d')
+            plan_name = common.Plans.get_name(active_plan.plan_id)
+            # Note: already loaded along with the active plan, no need to query it separately
+            plan = active_plan.plan
+
+            sms_string = f"Остаток смс в этом месяце {active_plan.messages_left}/{plan.messages}\n" \
+                if user.given_phone != "" else ""
+
+            parts.append(
+                f"Текущий тариф <b>{plan_name}</b>\n"
+                f"Остаток звонков в этом месяце: {active_plan.calls_left}/{plan.calls}\n"
+                f"{sms_string}"
+                f"Действует до {active_plan_end}\n\n"
+            )
+    else:
+        plan_name = common.Plans.get_name(user.subscription.id)
+        parts.append(
+            f"Текущий тариф <b>{plan_name}</b>\n"
+            f"Нет действующих пакетов\n"
+        )
+
+    return "".join(parts)
 
 
 @postponed(Dispatcher.message_handler, Text(equals='Мой тариф 💵'))
@@ -1601,25 +1705,7 @@ async def my_tariff_command(message: types.Message):
         assert user.subscription is not None, "Someone called tariff command without actual subscription"
 
         active_plans = await common.get_active_plans(user=user)
-        text_message = ''
-
-        if len(active_plans) > 0:
-            for active_plan in active_plans:
-                active_plan_end = str(active_plan.end)[0:10]
-                plan_name = common.Plans.get_name(active_plan.plan_id)
-                plan = await db.DatabaseApi().get_plan(plan_id=active_plan.plan_id)
-
-                sms_string = f"Остаток смс в этом месяце {active_plan.messages_left}/{plan.messages}\n" \
-                    if user.given_phone != "" else ""
-
-                text_message += f"Текущий тариф <b>{plan_name}</b>\n" \
-                                f"Остаток звонков в этом месяце: {active_plan.calls_left}/{plan.calls}\n" \
-                                f"{sms_string}" \
-                                f"Действует до {active_plan_end}\n\n"
-        else:
-            plan_name = common.Plans.get_name(user.subscription.id)
-            text_message += f"Текущий тариф <b>{plan_name}</b>\n" \
-                            f"Нет действующих пакетов\n"
+        text_message = _render_tariff_text(user, active_plans)
 
         await answer_message(message, text=text_message, reply_markup=ikb_my_tariff())
 
@@ -1631,7 +1717,7 @@ async def setting_command(message: types.Message):
         user: db.User = await get_user(message)
         user_config = await common.get_user_config(user)
 
-        kb = ikb_setting(
+        kb = _ikb_setting_cached(
             with_number=bool(user.given_phone),
             extra_autocharge=user.extra_plan_autocharge
         )
@@ -1647,24 +1733,7 @@ async def change_tariff_handler(callback: types.CallbackQuery, state: FSMContext
         assert user.subscription is not None, "Someone called tariff command without actual subscription"
 
         active_plans = await common.get_active_plans(user=user)
-        text_message = ''
-        if len(active_plans) > 0:
-            for active_plan in active_plans:
-                active_plan_end = str(active_plan.end)[0:10]
-                plan_name = common.Plans.get_name(active_plan.plan_id)
-                plan = await db.DatabaseApi().get_plan(plan_id=active_plan.plan_id)
-
-                sms_string = f"Остаток смс в этом месяце {active_plan.messages_left}/{plan.messages}\n" \
-                    if user.given_phone != "" else ""
-
-                text_message += f"Текущий тариф <b>{plan_name}</b>\n" \
-                                f"Остаток звонков в этом месяце: {active_plan.calls_left}/{plan.calls}\n" \
-                                f"{sms_string}" \
-                                f"Действует до {active_plan_end}\n\n"
-        else:
-            plan_name = common.Plans.get_name(user.subscription.id)
-            text_message += f"Текущий тариф <b>{plan_name}</b>\n" \
-                            f"Нет действующих пакетов\n"
+        text_message = _render_tariff_text(user, active_plans)
 
     edited_msg = await callback.message.edit_text(
         text=text_message + "\n\nВыберите тариф для смены:\n\n" +
@@ -1673,8 +1742,7 @@ async def change_tariff_handler(callback: types.CallbackQuery, state: FSMContext
              "текущие остатки пакета не будут перенесены",
         reply_markup=ikb_tariff()
         )
-    await record_message(edited_msg, callback.message)
-    await callback.answer()
+    await asyncio.gather(record_message(edited_msg, callback.message), callback.answer())
 
 
 @postponed(Dispatcher.callback_query_handler, text='Connect a virtual number')
@@ -1721,7 +1789,7 @@ async def customize_back_handler(callback: types.CallbackQuery, state: FSMContex
         user: db.User = await get_user(callback)
         user_config = await common.get_user_config(user)
 
-        kb = ikb_setting(
+        kb = _ikb_setting_cached(
             with_number=bool(user.given_phone),
             extra_autocharge=user.extra_plan_autocharge
         )
@@ -1731,24 +1799,24 @@ async def customize_back_handler(callback: types.CallbackQuery, state: FSMContex
 
 @postponed(Dispatcher.callback_query_handler, state=[Customization.Greeting, Customization.Name, Customization.ChatGPTInstructions], text="Cancel")
 async def customize_cancel_handler(callback: types.CallbackQuery, state: FSMContext):
-    await callback.message.delete()
+    _fire(callback.message.delete())
     await state.finish()
     await Customization.Menu.set()
 
 @postponed(Dispatcher.callback_query_handler, state=Customization.Menu, text="Cancel")
 async def customize_cancel_handler(callback: types.CallbackQuery, state: FSMContext):
-    await callback.message.delete()
+    _fire(callback.message.delete())
     async with db.DatabaseApi().session():
         user: db.User = await get_user(callback)
-        user_config = await common.get_user_config(user)
+        kb = ikb_customize(await common.get_user_config(user))
     await answer_message(
         callback.message, text=texts.Customize.ROOT,
-        reply_markup=ikb_customize(user_config)
+        reply_markup=kb
         )
 
 @postponed(Dispatcher.callback_query_handler, state=Customization.IgnorelistAdd, text="Cancel")
 async def customize_cancel_handler(callback: types.CallbackQuery, state: FSMContext):
-    await callback.message.delete()
+    _fire(callback.message.delete())
     await state.finish()
     await Customization.Ignorelist.set()
     await callback.answer()
@@ -1762,19 +1830,34 @@ async def customize_greeting_handler(callback: types.CallbackQuery):
     await callback.answer()
 
 
+_PUNCT_TABLE: typing.Final[dict[int, None]] = str.maketrans('', '', ',.:;!?')
+
+
 def is_valid_russian_text(text: str) -> bool:
     count = 0
-    words = text.split()
-    cleaned_words =  list(filter(None, [word.strip(",.:;!?") for word in words]))
+    # Note: split() never yields empty words, so no need to filter them out
+    cleaned_words = text.translate(_PUNCT_TABLE).split()
     threshold = 0.5
 
+    # Checked upfront, since the parsing loop below may stop early
+    if not all(map(contains_only_russian_letters, cleaned_words)):
+        return False
+
+    # Strict majority of the words must be recognized
+    needed = len(cleaned_words) // 2 + 1
+    remaining = len(cleaned_words)
+    morph = MorphAnalyzer()
+
     for word in cleaned_words:
-        if not contains_only_russian_letters(word):
-            return False
-        parse = MorphAnalyzer().parse(word)
+        remaining -= 1
+        parse = morph.parse(word)
         if parse[0].score > threshold:
             count += 1
-    return count > len(cleaned_words) // 2
+        if count >= needed:
+            return True
+        if count + remaining < needed:
+            return False
+    return False
 
 
 @postponed(Dispatcher.message_handler, state=Customization.Greeting, content_types=types.ContentTypes.TEXT)
@@ -1807,21 +1890,20 @@ async def customize_greeting_handler(message: types.Message, state: FSMContext):
         await answer_message(message, text=texts.Customize.ROOT, reply_markup=ikb_customize(user_config))
         return
 
-    async with db.DatabaseApi().session():
+    async with db.DatabaseApi().session() as session:
         user: db.User = await get_user(message)
         await common.update_user_config(
             user, dict(
                 VOX_GREETING=value,
             )
             )
-
-    # To let the previous change be commited first
-    async with db.DatabaseApi().session():
-        user_config = await common.get_user_config(user)
+        await session.flush()
+        await session.refresh(user.preferences)
+        kb = ikb_customize(await common.get_user_config(user))
 
     await answer_message(message, text="Сообщение приветствия успешно обновлено")
     await Customization.Menu.set()
-    await answer_message(message, text=texts.Customize.ROOT, reply_markup=ikb_customize(user_config))
+    await answer_message(message, text=texts.Customize.ROOT, reply_markup=kb)
 
 
 @postponed(Dispatcher.message_handler, state=Customization.Greeting, content_types=types.ContentTypes.VOICE)
@@ -1830,12 +1912,17 @@ async def customize_greeting_handler(message: types.Message, state: FSMContext):
 
     cached_path: str = f"tg_file/{message.voice.file_id}.ogg"
 
+    # Note: Voximplant can't play a Telegram file_id, so the greeting still has to be published.
+    #       Downloading through the bot reuses its connection pool instead of opening a new session.
+    voice_data: io.BytesIO = io.BytesIO()
+    await message.voice.download(destination_file=voice_data)
+
     public_url: str = await CloudStorageAPI().secure_upload_publish(
         cached_path,
-        url=await message.voice.get_url(),
+        data=voice_data,
     )
 
-    async with db.DatabaseApi().session():
+    async with db.DatabaseApi().session() as session:
         user: db.User = await get_user(message)
         await common.update_user_config(
             user, dict(
@@ -1845,11 +1932,9 @@ async def customize_greeting_handler(message: types.Message, state: FSMContext):
                 )],
             )
             )
-
-    # To let the previous change be commited first
-    async with db.DatabaseApi().session():
-        user_config = await common.get_user_config(user)
-        kb = ikb_customize(user_config)
+        await session.flush()
+        await session.refresh(user.preferences)
+        kb = ikb_customize(await common.get_user_config(user))
 
     await reply_wait.delete()
     await answer_message(message, text="Сообщение приветствия успешно обновлено")
@@ -1873,12 +1958,11 @@ async def change_voice_handler(callback: types.CallbackQuery):
 async def chosen_voice_handler(callback: types.CallbackQuery):
     voice_id = callback.data[6:]
 
-    async with db.DatabaseApi().session():
+    async with db.DatabaseApi().session() as session:
         user: db.User = await get_user(callback)
         await common.update_user_config(user, dict(VOX_VOICE=voice_id))
-
-    # To let the previous change be commited first
-    async with db.DatabaseApi().session():
+        await session.flush()
+        await session.refresh(user.preferences)
         user_config = await common.get_user_config(user)
 
     await answer_message(
@@ -1949,46 +2033,44 @@ async def customize_name_handler(message: types.Message, state: FSMContext):
         user: db.User = await get_user(message)
         await common.update_user_config(user, customization | dict(USER_DISPLAY_NAME=name))
         await session.flush()
-
-    async with db.DatabaseApi().session():
-        user: db.User = await get_user(message)
-        user_config = await common.get_user_config(user)
+        await session.refresh(user.preferences)
+        kb = ikb_customize(await common.get_user_config(user))
     
     await answer_message(message, text="Обращение успешно обновлено")
     await Customization.Menu.set()
-    await answer_message(message, text=texts.Customize.ROOT, reply_markup=ikb_customize(user_config))
+    await answer_message(message, text=texts.Customize.ROOT, reply_markup=kb)
 
 
 @postponed(Dispatcher.callback_query_handler, state=Customization.Menu, text='Change ignorelist')
 async def customize_ignorelist_handler(callback: types.CallbackQuery):
     await Customization.Ignorelist.set()
     async with db.DatabaseApi().session():
+        user: db.User = await get_user(callback)
         await answer_message(
             callback.message,
             text=texts.Customize.IGNORELIST,
-            reply_markup=ikb_ignorelist(await common.get_user_config(await get_user(callback)))
+            reply_markup=ikb_ignorelist(await common.get_user_config(user))
         )
     await callback.answer()
 
 
 @postponed(Dispatcher.callback_query_handler, cbd_ignorelist.filter(action="delete"), state=Customization.Ignorelist)
 async def customize_ignorelist_delete_handler(callback: types.CallbackQuery, callback_data: dict):
-    async with db.DatabaseApi().session():
+    async with db.DatabaseApi().session() as session:
         user: db.User = await get_user(callback)
 
         await common.update_user_ignore_list(user, callback_data["number"], action="remove")
+        await session.flush()
+        await session.refresh(user.preferences)
+        user_config = await common.get_user_config(user)
 
-    await answer_message(callback.message, text=f"Номер {callback_data['number']} успешно удален из игнор-листа")
-    await callback.answer()
-    await callback.message.delete()
-    async with db.DatabaseApi().session():
-        user: db.User = await get_user(callback)
-        await Customization.Ignorelist.set()
-        await answer_message(
-            callback.message,
-            text=texts.Customize.IGNORELIST,
-            reply_markup=ikb_ignorelist(await common.get_user_config(user))
-            )
+    # Updating the keyboard in place is a single round-trip, and the confirmation is just a toast
+    try:
+        await callback.message.edit_reply_markup(reply_markup=ikb_ignorelist(user_config))
+    except exceptions.MessageNotModified:
+        # Repeated taps on the same button: the number is already gone from the keyboard
+        pass
+    await callback.answer(f"Номер {callback_data['number']} успешно удален из игнор-листа")
 
 
 @postponed(Dispatcher.callback_query_handler, cbd_ignorelist.filter(action="add"), state=Customization.Ignorelist)
@@ -2001,6 +2083,7 @@ async def customize_ignorelist_add_handler(callback: types.CallbackQuery, callba
 
 
 def is_valid_phone_number(number) -> bool:
+    # Note: no shortcut for Russian numbers, since not every +7 number is assigned
     if number.startswith('8') and len(number) == 11:
         number = "+7" + number[1::]
     try:
@@ -2029,7 +2112,7 @@ async def customize_ignorelist_add_handler(message: types.Message, state: FSMCon
             user: db.User = await get_user(message)
             await answer_message(
                 message, text=texts.Customize.IGNORELIST,
-                reply_markup=ikb_ignorelist(await common.get_user_config(await get_user(message)))
+                reply_markup=ikb_ignorelist(await common.get_user_config(user))
                 )
         return
 
@@ -2037,14 +2120,14 @@ async def customize_ignorelist_add_handler(message: types.Message, state: FSMCon
         user: db.User = await get_user(message)
         await common.update_user_ignore_list(user, number, action="add")
         await session.flush()
+        await session.refresh(user.preferences)
 
-        user = await get_user(message)
         await answer_message(message, text=f"Номер {number} добавлен в игнор-лист")
 
         await Customization.Ignorelist.set()
         await answer_message(
             message, text=texts.Customize.IGNORELIST,
-            reply_markup=ikb_ignorelist(await common.get_user_config(await get_user(message)))
+            reply_markup=ikb_ignorelist(await common.get_user_config(user))
             )
         
 @postponed(Dispatcher.message_handler, state=Customization.IgnorelistAdd)
@@ -2055,7 +2138,7 @@ async def customize_ignorelist_add_handler(message: types.Message, state: FSMCon
         user: db.User = await get_user(message)
         await answer_message(
             message, text=texts.Customize.IGNORELIST,
-            reply_markup=ikb_ignorelist(await common.get_user_config(await get_user(message)))
+            reply_markup=ikb_ignorelist(await common.get_user_config(user))
             )
     return
 
@@ -2074,18 +2157,16 @@ async def customize_ignorelist_back_handler(callback: types.CallbackQuery, callb
 
 @postponed(Dispatcher.callback_query_handler, state=Customization.Menu, text='Change chatgpt')
 async def customize_chatgpt_handler(callback: types.CallbackQuery):
-    async with db.DatabaseApi().session():
+    async with db.DatabaseApi().session() as session:
         user: db.User = await get_user(callback)
         user_config = await common.get_user_config(user)
 
         await common.update_user_config(user, dict(
             CHATGPT_ENABLED=not user_config["CHATGPT_ENABLED"],
         ))
-
-    # To let the previous change be commited first
-    async with db.DatabaseApi().session():
-        user_config = await common.get_user_config(user)
-        kb = ikb_customize(user_config)
+        await session.flush()
+        await session.refresh(user.preferences)
+        kb = ikb_customize(await common.get_user_config(user))
 
     await callback.message.edit_reply_markup(reply_markup=kb)
     await callback.answer()
@@ -2112,25 +2193,25 @@ async def customize_chatgpt_instructions_handler(message: types.Message, state:
     if value.strip() == "-":
         value = None
     
-    async with db.DatabaseApi().session():
+    async with db.DatabaseApi().session() as session:
         user: db.User = await get_user(message)
 
         await common.update_user_config(user, dict(
             CHATGPT_INSTRUCTIONS=value,
         ))
+        await session.flush()
+        await session.refresh(user.preferences)
+        kb = ikb_customize(await common.get_user_config(user))
 
     await message.delete()
     await Customization.Menu.set()
-    async with db.DatabaseApi().session():
-        user: db.User = await get_user(message)
-        user_config = await common.get_user_config(user)
     await answer_message(message, text=f"Инструкции для ChatGPT обновлены")
-    await answer_message(message, text=texts.Customize.ROOT, reply_markup=ikb_customize(user_config))
+    await answer_message(message, text=texts.Customize.ROOT, reply_markup=kb)
 
 
 @postponed(Dispatcher.callback_query_handler, text='Turn off Busy')
 async def turn_off_busy_handler(callback: types.CallbackQuery):
-    edited_msg = await callback.message.edit_text(text='Вы точно хотите от нас уйти?(', reply_markup=ikb_turn_off_busy())
+    edited_msg = await callback.message.edit_text(text='Вы точно хотите от нас уйти?(', reply_markup=_IKB_TURN_OFF_BUSY)
     await record_message(edited_msg, callback.message)
 
 
@@ -2155,7 +2236,14 @@ async def turn_off_busy_handler(callback: types.CallbackQuery):
 
 # region incoming call machinery
 # region state struct
-@dataclasses.dataclass
+# (chat_id, message_id) -> (text, serialized reply markup) last sent to Telegram for a transcript chunk.
+# Kept outside of the state, since OngoingDialogData is reloaded from storage on every update.
+_sent_chunks: cachetools.LRUCache = cachetools.LRUCache(maxsize=10000)
+# (chat_id, call_id) -> hash of the whole transcript output (text and reply markup) last sent for that call
+_sent_outputs: cachetools.LRUCache = cachetools.LRUCache(maxsize=10000)
+
+
+@dataclasses.dataclass(slots=True)
 class OngoingDialogData:
     STORAGE_KEY: typing.ClassVar[str] = "ongoing_call_data"
 
@@ -2169,6 +2257,13 @@ class OngoingDialogData:
     is_answer: bool = False
     is_connect: bool = False
     is_finish: bool = False
+    # Note: not serialized. Rebuilt from message_lines on first use after loading from state
+    _rendered_body: str | None = dataclasses.field(default=None, init=False, repr=False, compare=False)
+    # Note: not serialized either. The number never changes after creation
+    _pretty_number: str = dataclasses.field(default="", init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._pretty_number = prettify_number(self.number)
 
     # region serialization
     @classmethod
@@ -2176,7 +2271,17 @@ class OngoingDialogData:
         return OngoingDialogData(**json)
 
     def to_json(self) -> dict[str, typing.Any]:
-        return dataclasses.asdict(self)
+        # Note: spelled out instead of dataclasses.asdict, which deep-copies reflectively on every state store
+        return {
+            "number": self.number,
+            "call_id": self.call_id,
+            "message_ids": list(self.message_ids),
+            "message_lines": list(self.message_lines),
+            "call_status": self.call_status,
+            "is_answer": self.is_answer,
+            "is_connect": self.is_connect,
+            "is_finish": self.is_finish,
+        }
 
     @classmethod
     def state_load(cls, data: typing.Mapping[str, typing.Any]) -> OngoingDialogData:
@@ -2205,50 +2310,37 @@ class OngoingDialogData:
 
     @property
     def pretty_number(self) -> str:
-        return prettify_number(self.number)
+        return self._pretty_number
 
     def build_text(self) -> str:
-        return "\n".join(
-            [
-                f"Звонок от {self.pretty_number}:",
-                *self.message_lines,
-                *([] if self.is_finish else [texts.ANSWER_PEOPLE]),
-                "",
-                f"<em>{self.call_status}<em>",
-            ]
-        )
+        if self._rendered_body is None:
+            # Every line carries its own leading newline, so that appending is a single concatenation
+            self._rendered_body = "".join(f"\n{line}" for line in self.message_lines)
+
+        answer_hint: str = "" if self.is_finish else f"\n{texts.ANSWER_PEOPLE}"
+
+        return f"Звонок от {self.pretty_number}:{self._rendered_body}{answer_hint}\n\n<em>{self.call_status}<em>"
 
     @staticmethod
     def _split_text(text: str, limit: int) -> typing.Generator[str, None, None]:
-        buf: io.StringIO = io.StringIO()
-        line_sz: int = 0
-
-        for ch in itertools.chain(text, [None]):
-            if buf.tell() >= limit or ch is None:
-                to_offload: int = buf.tell() - line_sz
-                buf.seek(0)
+        # Note: lines are only broken in the middle if they don't fit into a single chunk
+        pos: int = 0
+        size: int = len(text)
 
-                if to_offload <= 0:
-                    to_offload = limit
-                    line_sz -= to_offload
+        while True:
+            end: int = min(pos + limit, size)
 
-                yield buf.read(to_offload)
+            if end < size:
+                nl: int = text.rfind('\n', pos, end)
+                if nl > pos:
+                    end = nl + 1
 
-                remaining: str = buf.read()
-                # Note: not initialized in constructor because otherwise `tell()` wouldn't work as intended
-                buf = io.StringIO()
-                buf.write(remaining)
+            yield text[pos:end]
 
-            if ch is None:
+            pos = end
+            if pos >= size:
                 break
 
-            if ch == '\n':
-                line_sz = 0
-            else:
-                line_sz += 1
-
-            buf.write(ch)
-
     async def output(
         self,
         telegram_id: str,
@@ -2260,38 +2352,60 @@ class OngoingDialogData:
             reply_markup = None
 
             if not self.is_connect:
-                reply_markup = ikb_incoming_call(with_write_answer=not self.is_answer)
+                reply_markup = _ikb_incoming_call_cached(with_write_answer=not self.is_answer)
 
         if bot.get_current() is None:
             # I guess they might be unset for when we come here from a voximplant callback...?
             bot.set_current(bot)
             dp.set_current(dp)
 
-        # Note: guaranteed to be initialized after loop, because _split_text always makes at least one chunk
-        msg: types.Message
+        markup_sig: str | None = reply_markup.as_json() if reply_markup is not None else None
+        text: str = self.build_text()
 
-        for i, chunk in enumerate(self._split_text(self.build_text(), TG_MESSAGE_SIZE_LIMIT)):
-            if i < len(self.message_ids):
-                msg = await bot.edit_message_text(
-                    text=chunk,
-                    chat_id=telegram_id,
-                    message_id=self.message_ids[i],
-                    reply_markup=reply_markup,
-                )
-                await record_message(msg, msg)
-                self.message_ids[i] = msg.message_id  # Because, apparently, it might change?
-                continue
+        output_key: tuple[str, str] = (str(telegram_id), self.call_id)
+        output_sig: int = hash((text, markup_sig))
+        if _sent_outputs.get(output_key) == output_sig:
+            return  # Nothing changed since the last output, no need to even look at the chunks
+
+        chunks: list[str] = list(self._split_text(text, TG_MESSAGE_SIZE_LIMIT))
+        last: int = len(chunks) - 1
 
-            msg = await send_message(
+        # Note: the keyboard only goes with the last chunk
+        def chunk_markup(i: int) -> tuple[InlineKeyboardMarkup | None, str | None]:
+            return (reply_markup, markup_sig) if i == last else (None, None)
+
+        async def edit_chunk(i: int) -> None:
+            markup, sig = chunk_markup(i)
+            msg: types.Message = await bot.edit_message_text(
+                text=chunks[i],
                 chat_id=telegram_id,
-                text=chunk,
+                message_id=self.message_ids[i],
+                reply_markup=markup,
+            )
+            await record_message(msg, msg)
+            self.message_ids[i] = msg.message_id  # Because, apparently, it might change?
+            _sent_chunks[(str(telegram_id), msg.message_id)] = (chunks[i], sig)
+
+        # Existing messages are independent of each other, so they're edited concurrently.
+        # Unchanged ones are skipped, since they would only get us a MessageNotModified.
+        await asyncio.gather(*(
+            edit_chunk(i) for i in range(min(len(chunks), len(self.message_ids)))
+            if _sent_chunks.get((str(telegram_id), self.message_ids[i])) != (chunks[i], chunk_markup(i)[1])
+        ))
+
+        # New messages, on the other hand, are sent one by one to keep them in order
+        for i in range(len(self.message_ids), len(chunks)):
+            markup, sig = chunk_markup(i)
+            msg: types.Message = await send_message(
+                chat_id=telegram_id,
+                text=chunks[i],
+                reply_markup=markup,
             )
             self.message_ids.append(msg.message_id)
+            _sent_chunks[(str(telegram_id), msg.message_id)] = (chunks[i], sig)
 
-        if reply_markup is not None:
-            msg: types.Message | bool = await msg.edit_reply_markup(reply_markup)
-            assert isinstance(msg, types.Message), f"Unexpected type: {type(msg)}"
-            self.message_ids[-1] = msg.message_id
+        # Note: only recorded once everything went through, so that a failed output is retried next time
+        _sent_outputs[output_key] = output_sig
 
     @classmethod
     async def create(cls, number: str, call_id: str, telegram_id: str) -> OngoingDialogData:
@@ -2313,6 +2427,7 @@ class OngoingDialogData:
         call_completed: bool = False,
     ) -> None:
         self.message_lines.clear()
+        self._rendered_body = ""
         self.call_status = "[звонок продолжается...]"
 
         is_post_finish: bool = False
@@ -2364,11 +2479,10 @@ class OngoingDialogData:
         reply_markup: InlineKeyboardMarkup | None | type(Ellipsis) = ...
 
         if call_completed:
-            async with db.DatabaseApi().session():
-                user: db.User | None = await db.DatabaseApi().find_user(telegram_id=telegram_id)
+            user_status: common.CallUserStatus | None = await common.get_call_user_status(str(telegram_id))
 
-                if user is not None and user.given_phone != "":
-                    reply_markup = ikb_call_back()
+            if user_status is not None and user_status.has_given_phone:
+                reply_markup = _IKB_CALL_BACK
 
         try:
             await self.output(
@@ -2380,12 +2494,15 @@ class OngoingDialogData:
 
     def append_line(self, line: str) -> None:
         self.message_lines.append(line)
+        if self._rendered_body is not None:
+            self._rendered_body += f"\n{line}"
 
     def replace_last_line(self, line: str) -> None:
         if not self.message_lines:
             return self.append_line(line)
 
         self.message_lines[-1] = line
+        self._rendered_body = None
 
     async def quick_update_refresh(
         self,
@@ -2412,7 +2529,7 @@ class OngoingDialogData:
         elif command == "answer":
             assert answer_text is not None, "answer command missing answer_text"
             self.append_line(f"🤖: {answer_text}")
-            reply_markup = ikb_incoming_call(with_write_answer=not self.is_answer)
+            reply_markup = _ikb_incoming_call_cached(with_write_answer=not self.is_answer)
         elif command == "connect":
             self.append_line("========================")
             self.call_status = "[идет соединение...]"
@@ -2438,19 +2555,43 @@ class OngoingDialogData:
 
 
 # region handlers
+def _make_call_command(command: str, **extra: typing.Any) -> str:
+    """
+    Encode a command from the user for the call's command queue, with a fresh id and the current timestamp.
+    """
+
+    return orjson.dumps(
+        {'command': command, 'id': str(uuid.uuid4()), 'timestamp': str(time.time()), **extra}
+    ).decode()
+
+
+@functools.lru_cache(maxsize=None)
+def _fixed_call_command_prefix(command: str, side: str | None) -> str:
+    fields: dict[str, str] = {'command': command}
+    if side is not None:
+        fields['side'] = side
+
+    # Note: cut off the closing brace, the per-command fields are appended after it
+    return orjson.dumps(fields).decode()[:-1]
+
+
+def _make_fixed_call_command(command: str, side: str | None = None) -> str:
+    """
+    Same as `_make_call_command`, for commands without a payload.
+    Only the id and timestamp change between such commands, so they are spliced into a cached prefix.
+    """
+
+    return f'{_fixed_call_command_prefix(command, side)},"id":"{uuid.uuid4()}","timestamp":"{time.time()}"}}'
+
+
 @postponed(Dispatcher.callback_query_handler, text='I am busy', state=ProfileIncomingCall.LineIsBusy)
 async def busy_handler(callback: types.CallbackQuery, state: FSMContext):
     async with state.proxy() as data:
         with OngoingDialogData.in_state(data) as dialog_data:
             call_id = uuid.UUID(dialog_data.call_id)
-            command = json.dumps(
-                {
-                    'command': 'busy', 'id': str(uuid.uuid4()), 'side': 'user',
-                    'timestamp': str(datetime.timestamp(datetime.now())),
-                }
-            )
+            command = _make_fixed_call_command('busy', side='user')
             await dialog_data.quick_update_refresh("busy", callback=callback)
-            await tg_call_commands_queues[call_id].put(command)
+            tg_call_commands_queues[call_id].put_nowait(command)
     await callback.answer()
 
 
@@ -2459,14 +2600,9 @@ async def call_back_handler(callback: types.CallbackQuery, state: FSMContext):
     async with state.proxy() as data:
         with OngoingDialogData.in_state(data) as dialog_data:
             call_id = uuid.UUID(dialog_data.call_id)
-            command = json.dumps(
-                {
-                    'command': 'recall', 'id': str(uuid.uuid4()), 'side': 'user',
-                    'timestamp': str(datetime.timestamp(datetime.now())),
-                }
-            )
+            command = _make_fixed_call_command('recall', side='user')
             await dialog_data.quick_update_refresh("recall", callback=callback)
-            await tg_call_commands_queues[call_id].put(command)
+            tg_call_commands_queues[call_id].put_nowait(command)
     await callback.answer()
 
 
@@ -2475,17 +2611,12 @@ async def answer_button_handler(callback: types.CallbackQuery, state: FSMContext
     async with state.proxy() as data:
         with OngoingDialogData.in_state(data) as dialog_data:
             call_id = uuid.UUID(dialog_data.call_id)
-            command = json.dumps(
-                {
-                    'command': 'answer', 'id': str(uuid.uuid4()),
-                    'timestamp': str(datetime.timestamp(datetime.now())),
-                }
-            )
-            await tg_call_commands_queues[call_id].put(command)
+            command = _make_fixed_call_command('answer')
+            tg_call_commands_queues[call_id].put_nowait(command)
             dialog_data.is_answer = True
 
     # Note: no need to re-output via dialog_data, I guess...
-    await callback.message.edit_reply_markup(ikb_incoming_call(with_write_answer=False))
+    await callback.message.edit_reply_markup(_ikb_incoming_call_cached(with_write_answer=False))
     mes = await answer_message(callback.message, text="Напишите в чат, что хотите передать")
     await callback.answer()
     await asyncio.sleep(10)
@@ -2502,7 +2633,7 @@ async def answer_handler(message: types.Message, state: FSMContext):
         with OngoingDialogData.in_state(data) as dialog_data:
             call_id = uuid.UUID(dialog_data.call_id)
 
-            if message.content_type == types.ContentType.TEXT and message.text[0] == '/':
+            if message.content_type == types.ContentType.TEXT and message.text.startswith('/'):
                 mes = await answer_message(message, text='Вы не можете пользоваться командами во время звонка')
                 await asyncio.sleep(5)
                 await mes.delete()
@@ -2520,42 +2651,32 @@ async def answer_handler(message: types.Message, state: FSMContext):
                 # TODO: Clean up later...?
                 cached_path: str = f"tg_file/tmp_{message.voice.file_id}.ogg"
 
-                audio_public_url: str = await CloudStorageAPI().secure_upload_publish(
-                    cached_path,
-                    url=await message.voice.get_url(),
-                )
-
-                await reply_wait.delete()
-
                 # TODO: Extract the text for the readout
                 text = "<i>Голосовое сообщение</i>"
-                command = json.dumps(
-                    {
-                        'command': 'message',
-                        'id': str(uuid.uuid4()),
-                        'side': 'user',
-                        'text': text,
-                        'timestamp': str(datetime.timestamp(datetime.now())),
-                        'type': 'whole',
-                        'url': audio_public_url,
-                    }
-                )
+
+                audio_public_url: str
+                try:
+                    audio_public_url = await CloudStorageAPI().secure_upload_publish(
+                        cached_path,
+                        url=await message.voice.get_url(),
+                    )
+                except Exception:
+                    # Note: the transcript isn't updated, since the answer never reaches the call
+                    logging.exception("Failed to upload a voice answer")
+                    await reply_wait.edit_text("Не удалось отправить голосовое сообщение, попробуйте ещё раз")
+                    _fire(_delete_later(reply_wait, 5.))
+                    return
+
+                _fire(reply_wait.delete())
+
+                command = _make_call_command('message', side='user', text=text, type='whole', url=audio_public_url)
             else:
                 text = message.text
-                command = json.dumps(
-                    {
-                        'command': 'message',
-                        'id': str(uuid.uuid4()),
-                        'side': 'user',
-                        'text': text,
-                        'timestamp': str(datetime.timestamp(datetime.now())),
-                        'type': 'whole',
-                    }
-                )
+                command = _make_call_command('message', side='user', text=text, type='whole')
 
             # Note: This code is shared between text and voice messages
             await dialog_data.quick_update_refresh("answer", answer_text=text, telegram_id=message.chat.id)
-            await tg_call_commands_queues[call_id].put(command)
+            tg_call_commands_queues[call_id].put_nowait(command)
 
 
 @postponed(Dispatcher.callback_query_handler, text='Connect', state=ProfileIncomingCall.LineIsBusy)
@@ -2563,17 +2684,28 @@ async def connect_handler(callback: types.CallbackQuery, state: FSMContext):
     async with state.proxy() as data:
         with OngoingDialogData.in_state(data) as dialog_data:
             call_id = uuid.UUID(dialog_data.call_id)
-            command = json.dumps(
-                {
-                    'command': 'connect', 'destinationNumber': dialog_data.number, 'id': str(uuid.uuid4()),
-                    'side': 'user', 'timestamp': str(datetime.timestamp(datetime.now())),
-                }
-            )
+            command = _make_call_command('connect', side='user', destinationNumber=dialog_data.number)
             await dialog_data.quick_update_refresh("connect", callback=callback)
-            await tg_call_commands_queues[call_id].put(command)
+            tg_call_commands_queues[call_id].put_nowait(command)
     await callback.answer()
 
 
+def _transcript_call_number(callback: types.CallbackQuery, data: typing.Mapping[str, typing.Any]) -> str:
+    """
+    The (stripped) number of the caller whose call transcript `callback` was pressed on.
+    """
+
+    dialog_json: dict[str, typing.Any] | None = data.get(OngoingDialogData.STORAGE_KEY)
+
+    # Note: the state may already hold a newer call, hence the check that it's this transcript
+    if dialog_json is not None and callback.message.message_id in dialog_json["message_ids"]:
+        return dialog_json["number"]
+
+    # The dialog is dropped from the state shortly after the call ends, so this is the usual case
+    number: str = callback.message.text.split('\n', 1)[0].removeprefix("Звонок от ").removesuffix(":")
+    return strip_number(number)
+
+
 @postponed(Dispatcher.callback_query_handler, text='Callback after the end of call')
 async def recall_handler(callback: types.CallbackQuery, state: FSMContext):
     async with db.DatabaseApi().session():
@@ -2584,9 +2716,8 @@ async def recall_handler(callback: types.CallbackQuery, state: FSMContext):
     elif not has_service:
         await answer_message(callback.message, text=texts.NO_AVAILABLE_CALLS)
     else:
-        number = callback.message.text.split('\n', 1)[0].removeprefix("Звонок от ").removesuffix(":")
-        number = strip_number(number)
         async with state.proxy() as data:
+            number = _transcript_call_number(callback, data)
             # Note: not dialog_data.number! It's passed to a completely different handler
             data['number'] = number
             await start_outbound_call(callback=callback, destination=number)
@@ -2605,17 +2736,15 @@ async def resms_handler(callback: types.CallbackQuery, state: FSMContext):
     elif not has_service:
         await answer_message(callback.message, text=texts.NO_AVAILABLE_SMS)
     else:
-        number = callback.message.text.split('\n', 1)[0].removeprefix("Звонок от ").removesuffix(":")
-        number = strip_number(number)
-
         async with state.proxy() as data:
+            number = _transcript_call_number(callback, data)
             logging.info(f"message text to {number}")
             # Note: not dialog_data.number! It's passed to a completely different handler
             data['number'] = number
             await answer_message(
                 callback.message, text=f"Сообщение будет отправлено на номер: {prettify_number(data['number'])}. "
                                        f"Введите текст сообщения",
-                reply_markup=kb_cancel()
+                reply_markup=_KB_CANCEL
                 )
             await ProfileSendMessage.GetMessage.set()
     await callback.answer()
@@ -2666,16 +2795,14 @@ async def start_dialog(telegram_id: str, number: str, call_id: str):
                 )
 
     if prev_state is not None:
-        async with db.DatabaseApi().session():
-            user: db.User | None = await db.DatabaseApi().find_user(telegram_id=telegram_id)
-            if user is not None and len(user.active_plans) > 0:
-                reply_markup: ReplyKeyboardMarkup
-                if user.given_phone == "":
-                    reply_markup = kb_main_without_number()
-                else:
-                    reply_markup = kb_main_with_number()
-                await send_message(chat_id=telegram_id, text="Поступил новый звонок!", reply_markup=reply_markup)
-            del user
+        user_status: common.CallUserStatus | None = await common.get_call_user_status(telegram_id)
+        if user_status is not None and user_status.has_active_plans:
+            reply_markup: ReplyKeyboardMarkup
+            if not user_status.has_given_phone:
+                reply_markup = _KB_MAIN_WITHOUT_NUMBER
+            else:
+                reply_markup = _KB_MAIN_WITH_NUMBER
+            await send_message(chat_id=telegram_id, text="Поступил новый звонок!", reply_markup=reply_markup)
 
     async with state.proxy() as data:
         (await OngoingDialogData.create(number, call_id, telegram_id)).state_store(data)
@@ -2687,26 +2814,47 @@ async def start_dialog(telegram_id: str, number: str, call_id: str):
 
 async def finish(telegram_id: str, commands: list, record: str):
     state = FSMContext(storage=dp.storage, chat=telegram_id, user=telegram_id)
-    await process_command(telegram_id=telegram_id, request=commands, call_completed=True)
-
-    if await state.get_state() != ProfileIncomingCall.LineIsBusy.state:
-        logging.error(
-            "finish() called outside of a call. Ignoring",
-            stack_info=True,
-            extra=dict(
-                state=await state.get_state(),
-            ),
-        )
-        return
 
+    # Note: the proxy loads the state along with the data, so there's no need to query it separately
     async with state.proxy() as data:
+        if data.state != ProfileIncomingCall.LineIsBusy.state:
+            logging.error(
+                "finish() called outside of a call. Ignoring",
+                stack_info=True,
+                extra=dict(
+                    state=data.state,
+                ),
+            )
+            return
+
         with OngoingDialogData.in_state(data) as dialog_data:
+            # Note: same as process_command(), but without loading and storing the state separately
+            await dialog_data.update_from_commands_refresh(telegram_id, commands, call_completed=True)
+
             call_id = dialog_data.call_id
-            await send_audio_dialog(telegram_id, record, dialog_data.number)
+            number = dialog_data.number
+
+    try:
+        # Note: the final transcript is saved by now, so concurrent updates don't work on a stale one
+        await send_audio_dialog(telegram_id, record, number)
+    finally:
+        # Note: the caller (the call-finished API handler) doesn't need to wait for the cleanup
+        _fire(_finish_cleanup(telegram_id, call_id))
+
+
+async def _finish_cleanup(telegram_id: str, call_id: str) -> None:
+    """
+    Drops the finished call's dialog from the state after a short delay.
+    """
 
-        # TODO: better ensure this doesn't cause any race conditions...
-        await asyncio.sleep(3.)
-        if call_id == OngoingDialogData.state_load(data).call_id:
+    # TODO: better ensure this doesn't cause any race conditions...
+    await asyncio.sleep(3.)
+
+    state = FSMContext(storage=dp.storage, chat=telegram_id, user=telegram_id)
+    async with state.proxy() as data:
+        # Note: a new call may have taken its place in the meantime
+        dialog_json: dict[str, typing.Any] | None = data.get(OngoingDialogData.STORAGE_KEY)
+        if dialog_json is not None and dialog_json["call_id"] == call_id:
             OngoingDialogData.state_del(data)
 
         async with MultipleCallSynchronizationData.in_state(data, telegram_id, state) as call_sync:
@@ -2730,17 +2878,17 @@ async def finish(telegram_id: str, commands: list, record: str):
 async def process_command(telegram_id: str, request: list, call_completed=False):
     state = FSMContext(storage=dp.storage, chat=telegram_id, user=telegram_id)
 
-    if await state.get_state() != ProfileIncomingCall.LineIsBusy.state:
-        logging.error(
-            "process_command() called outside of a call. Ignoring",
-            stack_info=True,
-            extra=dict(
-                state=await state.get_state(),
-            ),
-        )
-        return
-
     async with state.proxy() as data:
+        if data.state != ProfileIncomingCall.LineIsBusy.state:
+            logging.error(
+                "process_command() called outside of a call. Ignoring",
+                stack_info=True,
+                extra=dict(
+                    state=data.state,
+                ),
+            )
+            return
+
         with OngoingDialogData.in_state(data) as dialog_data:
             await dialog_data.update_from_commands_refresh(telegram_id, request, call_completed)
 
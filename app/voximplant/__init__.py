@@ -1,18 +1,44 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import json
 import logging
+import re
+import time
+import urllib.parse
 from typing import Optional, Tuple
 import aiohttp
+import cachetools
+import orjson
 from datetime import datetime
 
 from voximplant.apiclient import VoximplantAPI, VoximplantException
 
-client: VoximplantAsyncApi
+_client: VoximplantAsyncApi | None = None
+# Set by close(), so that nothing creates a new client during or after shutdown
+_closed: bool = False
+
+# Bounds for call history lookups that should match any call
+_MIN_CALL_DATE: datetime = datetime(1970, 1, 1)
+_MAX_CALL_DATE: datetime = datetime(3000, 1, 1)
+
+# Numbers that support SMS are marked as such in their region name
+_SMS_SUPPORT_PATTERN: re.Pattern = re.compile(r'sms support', re.IGNORECASE)
+
+# Request parameters that the platform API accepts as ';'-separated lists
+_LIST_PARAMS: frozenset[str] = frozenset({
+    'call_session_history_id', 'user_id', 'remote_number', 'local_number', 'child_account_id',
+    'scenario_id', 'scenario_name', 'phone_id', 'phone_number',
+})
 
 
 # Don't want to store credentials in a file
 class VoximplantAPICustom(VoximplantAPI):
+    # The header is a signed JWT that expires about a minute after it's issued,
+    # so it's re-signed well before that instead of on every request
+    AUTH_HEADER_TTL: float = 30.
+
     def __init__(self, credentials: str, endpoint=None):
         self.credentials = json.loads(credentials)
         if self.credentials is None:
@@ -23,28 +49,64 @@ class VoximplantAPICustom(VoximplantAPI):
         else:
             self.endpoint = "api.voximplant.com"
 
+        self.__auth_header: str | None = None
+        self.__auth_header_time: float = 0.
+
+    def get_cached_auth_header(self) -> str:
+        now: float = time.monotonic()
+        if self.__auth_header is None or now - self.__auth_header_time > self.AUTH_HEADER_TTL:
+            self.__auth_header = self.build_auth_header()
+            self.__auth_header_time = now
+        return self.__auth_header
+
 
 class VoximplantAsyncApi:
-    def __init__(self, credentials: str, application_name, outbound_call_rule_id, endpoint=None):
+    def __init__(self, credentials: str, application_name, outbound_call_rule_id, endpoint=None,
+                 max_concurrency: int = 10):
         self.__voximplant = VoximplantAPICustom(credentials, endpoint)
+        self.__endpoint_url: str = 'https://{}/platform_api'.format(self.__voximplant.endpoint)
         self.__application_name = application_name
         self.__outbound_call_rule_id = outbound_call_rule_id
+        # Call history lookups mostly use the same fixed bounds, so there's no need to format them every time
+        self.__format_date = functools.lru_cache(maxsize=256)(self.__voximplant._py_datetime_to_api)
+        # Created on first use, so that it's bound to the running event loop
+        self.__session: aiohttp.ClientSession | None = None
+        # Bounds the platform API requests in flight, so that bursts don't run into Voximplant's rate limits
+        self.__request_semaphore = asyncio.Semaphore(max_concurrency)
+        # session_id -> transcript text. Transcripts don't change once the call has ended
+        self.__transcripts: cachetools.TTLCache = cachetools.TTLCache(maxsize=1024, ttl=24 * 60 * 60)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Returns the HTTP session shared by all requests, so that connections to Voximplant are kept alive.
+        """
 
-    async def send_sms_message(self, source: str, destination: str, sms_body: str) -> dict:
-        params = dict()
-        params['source'] = source
-        params['destination'] = destination
-        params['sms_body'] = sms_body
+        if self.__session is None or self.__session.closed:
+            # Almost everything goes to a single host, so idle connections are kept around
+            # for longer than the default 15s to survive the gaps within a call's flow
+            connector = aiohttp.TCPConnector(
+                limit=50,
+                limit_per_host=20,
+                keepalive_timeout=120,
+                ttl_dns_cache=300,
+                enable_cleanup_closed=True,
+            )
+            self.__session = aiohttp.ClientSession(connector=connector)
+        return self.__session
+
+    async def close(self) -> None:
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
 
-        res = await self._perform_request('SendSmsMessage', params)
-        if 'error' in res:
-            raise VoximplantException(res['error']['msg'], res['error']['code'])
+    async def send_sms_message(self, source: str, destination: str, sms_body: str) -> dict:
+        params = self._pack(source=source, destination=destination, sms_body=sms_body)
 
-        return res
+        return self._check(await self._perform_request('SendSmsMessage', params))
 
     async def start_outbound_call(self, caller: str, destination: str, voximplant_number: str, call_id: str) -> dict:
-        custom_data = json.dumps({'caller': caller, 'destination': destination, 'voximplantNumber': voximplant_number,
-                                  'callId': call_id})
+        custom_data = orjson.dumps({'caller': caller, 'destination': destination, 'voximplantNumber': voximplant_number,
+                                    'callId': call_id}).decode()
         return await self.__start_scenarios(self.__outbound_call_rule_id, script_custom_data=custom_data)
 
     async def buy_new_number(self) -> Optional[Tuple[str, float, float]]:
@@ -68,27 +130,38 @@ class VoximplantAsyncApi:
 
         await self.__control_sms(number, 'enable')
 
-        await self.__bind_phone_number_to_application(phone_number=[number], rule_id=self.__outbound_call_rule_id,
-                                                      application_name=self.__application_name, bind=True)
-        # can't create user with empty password by http request
-        await self.__add_user(number, number, '7a4wy2nA?&_', application_name=self.__application_name)
+        # Binding the number and creating its user don't depend on each other
+        await asyncio.gather(
+            self.__bind_phone_number_to_application(phone_number=[number], rule_id=self.__outbound_call_rule_id,
+                                                    application_name=self.__application_name, bind=True),
+            # can't create user with empty password by http request
+            self.__add_user(number, number, '7a4wy2nA?&_', application_name=self.__application_name),
+        )
 
         return number, installation_price, monthly_price
 
     async def get_transcript(self, session_id: str) -> str:
-        DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
-        MIN_DATE = datetime.strptime('1970-01-01 00:00:00', DATE_FORMAT)
-        MAX_DATE = datetime.strptime('3000-01-01 00:00:00', DATE_FORMAT)
-        result = await self.__get_call_history(MIN_DATE, MAX_DATE, call_session_history_id=session_id,
+        transcript: str | None = self.__transcripts.get(session_id)
+        if transcript is None:
+            transcript = await self.__fetch_transcript(session_id)
+            self.__transcripts[session_id] = transcript
+
+        return transcript
+
+    async def __fetch_transcript(self, session_id: str) -> str:
+        result = await self.__get_call_history(_MIN_CALL_DATE, _MAX_CALL_DATE, call_session_history_id=session_id,
                                                with_records=True)
         transcript_url = result['result'][0]['records'][0]['transcription_url']
-        # todo: store session in field
-        async with aiohttp.ClientSession() as session:
-            async with session.get(transcript_url) as response:
-                OK_STATUS = 200
-                if response.status != OK_STATUS:
-                    raise VoximplantException(response.status)
-                return await response.text()
+        async with self._get_session().get(transcript_url) as response:
+            OK_STATUS = 200
+            if response.status != OK_STATUS:
+                raise VoximplantException(response.status)
+
+            # Note: read in chunks rather than with `text()`, so that the response doesn't keep its own copy of the body
+            body = bytearray()
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                body += chunk
+            return body.decode(response.charset or 'utf-8')
 
     async def __pick_number(self, country_code, phone_category, region) -> Optional[Tuple[str, float, float]]:
         COUNT = 20
@@ -98,7 +171,7 @@ class VoximplantAsyncApi:
         for number_info in numbers_info:
             if number_info['phone_period'] != PERIOD_ONE_MONTH:
                 continue
-            if 'sms support' not in number_info['phone_region_name'].lower():
+            if not _SMS_SUPPORT_PATTERN.search(number_info['phone_region_name']):
                 continue
             phone_price = number_info['phone_price']
             installation_price = number_info['phone_installation_price']
@@ -115,84 +188,23 @@ class VoximplantAsyncApi:
 
         :rtype: dict
         """
-        params = dict()
-
-        passed_args = []
-        if application_id is not None:
-            passed_args.append('application_id')
-        if application_name is not None:
-            passed_args.append('application_name')
-
-        if len(passed_args) > 1:
-            raise VoximplantException(", ".join(passed_args) + " passed simultaneously into get_call_history")
-
-        params['from_date'] = self.__voximplant._py_datetime_to_api(from_date)
-
-        params['to_date'] = self.__voximplant._py_datetime_to_api(to_date)
-
-        if call_session_history_id is not None:
-            params['call_session_history_id'] = self.__voximplant._serialize_list(call_session_history_id)
-
-        if application_id is not None:
-            params['application_id'] = application_id
-
-        if application_name is not None:
-            params['application_name'] = application_name
-
-        if user_id is not None:
-            params['user_id'] = self.__voximplant._serialize_list(user_id)
-
-        if rule_name is not None:
-            params['rule_name'] = rule_name
-
-        if remote_number is not None:
-            params['remote_number'] = self.__voximplant._serialize_list(remote_number)
-
-        if local_number is not None:
-            params['local_number'] = self.__voximplant._serialize_list(local_number)
-
-        if call_session_history_custom_data is not None:
-            params['call_session_history_custom_data'] = call_session_history_custom_data
-
-        if with_calls is not None:
-            params['with_calls'] = with_calls
-
-        if with_records is not None:
-            params['with_records'] = with_records
-
-        if with_other_resources is not None:
-            params['with_other_resources'] = with_other_resources
-
-        if child_account_id is not None:
-            params['child_account_id'] = self.__voximplant._serialize_list(child_account_id)
-
-        if children_calls_only is not None:
-            params['children_calls_only'] = children_calls_only
-
-        if with_header is not None:
-            params['with_header'] = with_header
-
-        if desc_order is not None:
-            params['desc_order'] = desc_order
-
-        if with_total_count is not None:
-            params['with_total_count'] = with_total_count
-
-        if count is not None:
-            params['count'] = count
-
-        if offset is not None:
-            params['offset'] = offset
-
-        if output is not None:
-            params['output'] = output
-
-        if is_async is not None:
-            params['is_async'] = is_async
-
-        res = await self._perform_request('GetCallHistory', params)
-        if 'error' in res:
-            raise VoximplantException(res['error']['msg'], res['error']['code'])
+        self._check_exclusive(
+            'get_call_history', required=False, application_id=application_id, application_name=application_name
+        )
+
+        params = self._pack(
+            from_date=self.__format_date(from_date),
+            to_date=self.__format_date(to_date),
+            call_session_history_id=call_session_history_id, application_id=application_id,
+            application_name=application_name, user_id=user_id, rule_name=rule_name, remote_number=remote_number,
+            local_number=local_number, call_session_history_custom_data=call_session_history_custom_data,
+            with_calls=with_calls, with_records=with_records, with_other_resources=with_other_resources,
+            child_account_id=child_account_id, children_calls_only=children_calls_only, with_header=with_header,
+            desc_order=desc_order, with_total_count=with_total_count, count=count, offset=offset, output=output,
+            is_async=is_async,
+        )
+
+        res = self._check(await self._perform_request('GetCallHistory', params))
         if 'result' in res:
             for p in res['result']:
                 self.__voximplant._preprocess_call_session_info_type(p)
@@ -205,45 +217,17 @@ class VoximplantAsyncApi:
 
         :rtype: dict
         """
-        params = dict()
-
-        passed_args = []
-        if application_id is not None:
-            passed_args.append('application_id')
-        if application_name is not None:
-            passed_args.append('application_name')
-
-        if len(passed_args) > 1:
-            raise VoximplantException(", ".join(passed_args) + " passed simultaneously into add_user")
-        if len(passed_args) == 0:
-            raise VoximplantException("None of application_id, application_name passed into add_user")
+        self._check_exclusive(
+            'add_user', required=True, application_id=application_id, application_name=application_name
+        )
 
-        params['user_name'] = user_name
+        params = self._pack(
+            user_name=user_name, user_display_name=user_display_name, user_password=user_password,
+            application_id=application_id, application_name=application_name, parent_accounting=parent_accounting,
+            user_active=user_active, user_custom_data=user_custom_data,
+        )
 
-        params['user_display_name'] = user_display_name
-
-        params['user_password'] = user_password
-
-        if application_id is not None:
-            params['application_id'] = application_id
-
-        if application_name is not None:
-            params['application_name'] = application_name
-
-        if parent_accounting is not None:
-            params['parent_accounting'] = parent_accounting
-
-        if user_active is not None:
-            params['user_active'] = user_active
-
-        if user_custom_data is not None:
-            params['user_custom_data'] = user_custom_data
-
-        res = await self._perform_request('AddUser', params)
-        if "error" in res:
-            raise VoximplantException(res["error"]["msg"], res["error"]["code"])
-
-        return res
+        return self._check(await self._perform_request('AddUser', params))
 
     async def __control_sms(self, phone_number, command):
         """
@@ -251,17 +235,9 @@ class VoximplantAsyncApi:
 
         :rtype: dict
         """
-        params = dict()
+        params = self._pack(phone_number=phone_number, command=command)
 
-        params['phone_number'] = phone_number
-
-        params['command'] = command
-
-        res = await self._perform_request('ControlSms', params)
-        if 'error' in res:
-            raise VoximplantException(res['error']['msg'], res['error']['code'])
-
-        return res
+        return self._check(await self._perform_request('ControlSms', params))
 
     async def __add_rule(self, rule_name, rule_pattern, application_id=None, application_name=None,
                          rule_pattern_exclude=None, video_conference=None, scenario_id=None, scenario_name=None):
@@ -270,57 +246,18 @@ class VoximplantAsyncApi:
 
         :rtype: dict
         """
-        params = dict()
-
-        passed_args = []
-        if application_id is not None:
-            passed_args.append('application_id')
-        if application_name is not None:
-            passed_args.append('application_name')
-
-        if len(passed_args) > 1:
-            raise VoximplantException(", ".join(passed_args) + " passed simultaneously into add_rule")
-        if len(passed_args) == 0:
-            raise VoximplantException("None of application_id, application_name passed into add_rule")
-
-        passed_args = []
-        if scenario_id is not None:
-            passed_args.append('scenario_id')
-        if scenario_name is not None:
-            passed_args.append('scenario_name')
-
-        if len(passed_args) > 1:
-            raise VoximplantException(", ".join(passed_args) + " passed simultaneously into add_rule")
-        if len(passed_args) == 0:
-            raise VoximplantException("None of scenario_id, scenario_name passed into add_rule")
-
-        params['rule_name'] = rule_name
-
-        params['rule_pattern'] = rule_pattern
-
-        if application_id is not None:
-            params['application_id'] = application_id
-
-        if application_name is not None:
-            params['application_name'] = application_name
+        self._check_exclusive(
+            'add_rule', required=True, application_id=application_id, application_name=application_name
+        )
+        self._check_exclusive('add_rule', required=True, scenario_id=scenario_id, scenario_name=scenario_name)
 
-        if rule_pattern_exclude is not None:
-            params['rule_pattern_exclude'] = rule_pattern_exclude
+        params = self._pack(
+            rule_name=rule_name, rule_pattern=rule_pattern, application_id=application_id,
+            application_name=application_name, rule_pattern_exclude=rule_pattern_exclude,
+            video_conference=video_conference, scenario_id=scenario_id, scenario_name=scenario_name,
+        )
 
-        if video_conference is not None:
-            params['video_conference'] = video_conference
-
-        if scenario_id is not None:
-            params['scenario_id'] = self.__voximplant._serialize_list(scenario_id)
-
-        if scenario_name is not None:
-            params['scenario_name'] = self.__voximplant._serialize_list(scenario_name)
-
-        res = await self._perform_request('AddRule', params)
-        if 'error' in res:
-            raise VoximplantException(res['error']['msg'], res['error']['code'])
-
-        return res
+        return self._check(await self._perform_request('AddRule', params))
 
     async def __bind_phone_number_to_application(self, phone_id=None, phone_number=None, application_id=None,
                                                  application_name=None, rule_id=None, rule_name=None, bind=None):
@@ -330,69 +267,21 @@ class VoximplantAsyncApi:
 
         :rtype: dict
         """
-        params = dict()
-
-        passed_args = []
-        if phone_id is not None:
-            passed_args.append('phone_id')
-        if phone_number is not None:
-            passed_args.append('phone_number')
-
-        if len(passed_args) > 1:
-            raise VoximplantException(
-                ", ".join(passed_args) + " passed simultaneously into bind_phone_number_to_application")
-        if len(passed_args) == 0:
-            raise VoximplantException("None of phone_id, phone_number passed into bind_phone_number_to_application")
-
-        passed_args = []
-        if application_id is not None:
-            passed_args.append('application_id')
-        if application_name is not None:
-            passed_args.append('application_name')
-
-        if len(passed_args) > 1:
-            raise VoximplantException(
-                ", ".join(passed_args) + " passed simultaneously into bind_phone_number_to_application")
-        if len(passed_args) == 0:
-            raise VoximplantException(
-                "None of application_id, application_name passed into bind_phone_number_to_application")
-
-        passed_args = []
-        if rule_id is not None:
-            passed_args.append('rule_id')
-        if rule_name is not None:
-            passed_args.append('rule_name')
-
-        if len(passed_args) > 1:
-            raise VoximplantException(
-                ", ".join(passed_args) + " passed simultaneously into bind_phone_number_to_application")
-
-        if phone_id is not None:
-            params['phone_id'] = self.__voximplant._serialize_list(phone_id)
-
-        if phone_number is not None:
-            params['phone_number'] = self.__voximplant._serialize_list(phone_number)
-
-        if application_id is not None:
-            params['application_id'] = application_id
-
-        if application_name is not None:
-            params['application_name'] = application_name
-
-        if rule_id is not None:
-            params['rule_id'] = rule_id
-
-        if rule_name is not None:
-            params['rule_name'] = rule_name
-
-        if bind is not None:
-            params['bind'] = bind
-
-        res = await self._perform_request('BindPhoneNumberToApplication', params)
-        if 'error' in res:
-            raise VoximplantException(res['error']['msg'], res['error']['code'])
-
-        return res
+        self._check_exclusive(
+            'bind_phone_number_to_application', required=True, phone_id=phone_id, phone_number=phone_number
+        )
+        self._check_exclusive(
+            'bind_phone_number_to_application', required=True,
+            application_id=application_id, application_name=application_name,
+        )
+        self._check_exclusive('bind_phone_number_to_application', required=False, rule_id=rule_id, rule_name=rule_name)
+
+        params = self._pack(
+            phone_id=phone_id, phone_number=phone_number, application_id=application_id,
+            application_name=application_name, rule_id=rule_id, rule_name=rule_name, bind=bind,
+        )
+
+        return self._check(await self._perform_request('BindPhoneNumberToApplication', params))
 
     async def __attach_phone_number(self, country_code, phone_category_name, phone_region_id, phone_count=None,
                                     phone_number=None, country_state=None, regulation_address_id=None):
@@ -401,42 +290,15 @@ class VoximplantAsyncApi:
 
         :rtype: dict
         """
-        params = dict()
-
-        passed_args = []
-        if phone_count is not None:
-            passed_args.append('phone_count')
-        if phone_number is not None:
-            passed_args.append('phone_number')
-
-        if len(passed_args) > 1:
-            raise VoximplantException(", ".join(passed_args) + " passed simultaneously into attach_phone_number")
-        if len(passed_args) == 0:
-            raise VoximplantException("None of phone_count, phone_number passed into attach_phone_number")
-
-        params['country_code'] = country_code
-
-        params['phone_category_name'] = phone_category_name
-
-        params['phone_region_id'] = phone_region_id
-
-        if phone_count is not None:
-            params['phone_count'] = phone_count
-
-        if phone_number is not None:
-            params['phone_number'] = self.__voximplant._serialize_list(phone_number)
+        self._check_exclusive('attach_phone_number', required=True, phone_count=phone_count, phone_number=phone_number)
 
-        if country_state is not None:
-            params['country_state'] = country_state
+        params = self._pack(
+            country_code=country_code, phone_category_name=phone_category_name, phone_region_id=phone_region_id,
+            phone_count=phone_count, phone_number=phone_number, country_state=country_state,
+            regulation_address_id=regulation_address_id,
+        )
 
-        if regulation_address_id is not None:
-            params['regulation_address_id'] = regulation_address_id
-
-        res = await self._perform_request('AttachPhoneNumber', params)
-        if 'error' in res:
-            raise VoximplantException(res['error']['msg'], res['error']['code'])
-
-        return res
+        return self._check(await self._perform_request('AttachPhoneNumber', params))
 
     async def __get_new_phone_numbers(self, country_code, phone_category_name, phone_region_id, country_state=None,
                                       count=None, offset=None):
@@ -445,26 +307,12 @@ class VoximplantAsyncApi:
 
         :rtype: dict
         """
-        params = dict()
-
-        params['country_code'] = country_code
-
-        params['phone_category_name'] = phone_category_name
-
-        params['phone_region_id'] = phone_region_id
-
-        if country_state is not None:
-            params['country_state'] = country_state
-
-        if count is not None:
-            params['count'] = count
-
-        if offset is not None:
-            params['offset'] = offset
+        params = self._pack(
+            country_code=country_code, phone_category_name=phone_category_name, phone_region_id=phone_region_id,
+            country_state=country_state, count=count, offset=offset,
+        )
 
-        res = await self._perform_request('GetNewPhoneNumbers', params)
-        if 'error' in res:
-            raise VoximplantException(res['error']["msg"], res['error']['code'])
+        res = self._check(await self._perform_request('GetNewPhoneNumbers', params))
         if 'result' in res:
             for p in res['result']:
                 self.__voximplant._preprocess_new_phone_info_type(p)
@@ -477,74 +325,87 @@ class VoximplantAsyncApi:
 
         :rtype: dict
         """
-        params = dict()
+        self._check_exclusive('start_scenarios', required=False, user_id=user_id, user_name=user_name)
+        self._check_exclusive(
+            'start_scenarios', required=False, application_id=application_id, application_name=application_name
+        )
 
-        passed_args = []
-        if user_id is not None:
-            passed_args.append('user_id')
-        if user_name is not None:
-            passed_args.append('user_name')
+        params = self._pack(
+            rule_id=rule_id, user_id=user_id, user_name=user_name, application_id=application_id,
+            application_name=application_name, script_custom_data=script_custom_data, reference_ip=reference_ip,
+        )
 
-        if len(passed_args) > 1:
-            raise VoximplantException(", ".join(passed_args) + " passed simultaneously into start_scenarios")
-
-        passed_args = []
-        if application_id is not None:
-            passed_args.append('application_id')
-        if application_name is not None:
-            passed_args.append('application_name')
-
-        if len(passed_args) > 1:
-            raise VoximplantException(", ".join(passed_args) + " passed simultaneously into start_scenarios")
-
-        params['rule_id'] = rule_id
+        return self._check(await self._perform_request('StartScenarios', params))
 
-        if user_id is not None:
-            params['user_id'] = user_id
-
-        if user_name is not None:
-            params['user_name'] = user_name
+    @staticmethod
+    def _check_exclusive(method: str, *, required: bool, **kwargs) -> None:
+        """
+        Checks that at most one (or, if `required`, exactly one) of the passed arguments isn't None.
+        """
 
-        if application_id is not None:
-            params['application_id'] = application_id
+        passed_args = [key for key, value in kwargs.items() if value is not None]
 
-        if application_name is not None:
-            params['application_name'] = application_name
+        if len(passed_args) > 1:
+            raise VoximplantException(", ".join(passed_args) + f" passed simultaneously into {method}")
+        if required and len(passed_args) == 0:
+            raise VoximplantException(f"None of {', '.join(kwargs)} passed into {method}")
 
-        if script_custom_data is not None:
-            params['script_custom_data'] = script_custom_data
+    @staticmethod
+    def _check(res: dict) -> dict:
+        """
+        Raises the error reported in a platform API response, if any. Otherwise, returns the response as is.
+        """
 
-        if reference_ip is not None:
-            params['reference_ip'] = reference_ip
+        error: dict | None = res.get('error')
+        if error is not None:
+            raise VoximplantException(error['msg'], error['code'])
+        return res
 
-        res = await self._perform_request('StartScenarios', params)
-        if 'error' in res:
-            raise VoximplantException(res['error']['msg'], res['error']['code'])
+    def _pack(self, **kwargs) -> dict:
+        """
+        Builds request parameters out of the passed ones, skipping those that are None.
+        """
 
-        return res
+        return {
+            key: self.__voximplant._serialize_list(value) if key in _LIST_PARAMS else value
+            for key, value in kwargs.items()
+            if value is not None
+        }
 
     async def _perform_request(self, cmd, args) -> dict:
-        params = args.copy()
-        params['cmd'] = cmd
-        headers = {'Authorization': self.__voximplant.build_auth_header()}
+        # Note: no copy, every caller builds a fresh dict of params just for this request
+        args['cmd'] = cmd
+        headers = {
+            'Authorization': self.__voximplant.get_cached_auth_header(),
+            'Content-Type': 'application/x-www-form-urlencoded',
+        }
+        # Note: encoded here rather than by aiohttp, which would wrap the dict into a FormData first
+        body: bytes = urllib.parse.urlencode(args, doseq=True).encode()
         OK_STATUS = 200
-        # todo: store session in field
-        async with aiohttp.ClientSession() as session:
-            async with session.post('https://{}/platform_api'.format(self.__voximplant.endpoint),
-                                    data=params, headers=headers) as response:
+        async with self.__request_semaphore:
+            async with self._get_session().post(self.__endpoint_url, data=body, headers=headers) as response:
                 if response.status != OK_STATUS:
                     raise VoximplantException(response.status)
-                return await response.json()
+                return await response.json(loads=orjson.loads)
 
 
-async def run() -> None:
+def get_client() -> VoximplantAsyncApi:
+    """
+    Returns the shared client, creating it on first use.
+    """
+
+    global _client
+
+    if _client is not None:
+        return _client
+
+    if _closed:
+        raise RuntimeError("The Voximplant client has already been shut down.")
+
     import config
     if config.VOX_CREDENTIALS is None:
-        logging.error("No Voximplant credentials found in env. Stopping.")
-        return
+        raise RuntimeError("No Voximplant credentials found in env.")
 
-    global client
-    
     # todo: move variables to config
     application_name = 'busy-prod.levashov.n4.voximplant.com'
     outbound_call_rule_id = '3602168'
@@ -553,12 +414,41 @@ async def run() -> None:
         application_name = 'phone-assistant.levashov.n4.voximplant.com'
         outbound_call_rule_id = '3584070'
 
-    client = VoximplantAsyncApi(config.VOX_CREDENTIALS, application_name, outbound_call_rule_id)
+    _client = VoximplantAsyncApi(config.VOX_CREDENTIALS, application_name, outbound_call_rule_id,
+                                 max_concurrency=config.VOX_MAX_CONCURRENT_REQUESTS)
+    return _client
+
+
+async def close() -> None:
+    """
+    Closes the shared client, if it was ever created. `get_client()` raises afterwards.
+    Must be called on shutdown, whether or not `run()` was.
+    """
+
+    global _client, _closed
+
+    _closed = True
+
+    client: VoximplantAsyncApi | None = _client
+    _client = None
+    if client is not None:
+        await client.close()
+
+
+async def run() -> None:
+    import config
+    if config.VOX_CREDENTIALS is None:
+        logging.error("No Voximplant credentials found in env. Stopping.")
+        return
+
+    # Note: created eagerly, so that configuration errors show up on startup
+    get_client()
 
-    # No cleanup and no background task, so we can exit immediately
+    # Nothing left to do, exiting early. The client is closed by `close()` on shutdown
 
 
 __all__ = [
     "run",
-    "client",
+    "get_client",
+    "close",
 ]
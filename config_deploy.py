@@ -19,6 +19,7 @@ TELEGRAM_BOT_SECRET: typing.Final[str | None] = os.getenv("TELEGRAM_BOT_SECRET")
 
 VOX_CREDENTIALS: typing.Final[str] = os.getenv("VOX_CREDENTIALS")
 VOX_MAIN_NUMBER: typing.Final[str] = "79993331265"
+VOX_MAX_CONCURRENT_REQUESTS: typing.Final[int] = 10
 
 ONESIGNAL_APP_ID: typing.Final[str | None] = os.getenv("ONESIGNAL_APP_ID")
 ONESIGNAL_REST_API_KEY: typing.Final[str | None] = os.getenv("ONESIGNAL_REST_API_KEY")
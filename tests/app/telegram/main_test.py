@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import typing
+import unittest
+
+from app.telegram.main import is_valid_phone_number
+
+
+class TestIsValidPhoneNumber(unittest.TestCase):
+    def test_valid_russian_number(self) -> None:
+        self.assertTrue(is_valid_phone_number("+79991234567"))
+
+    def test_valid_russian_number_with_trunk_prefix(self) -> None:
+        self.assertTrue(is_valid_phone_number("89991234567"))
+
+    def test_unassigned_russian_numbers(self) -> None:
+        for number in ["+70000000000", "+71234567890", "80000000000"]:
+            with self.subTest(number=number):
+                self.assertFalse(is_valid_phone_number(number))
+
+    def test_foreign_number(self) -> None:
+        self.assertTrue(is_valid_phone_number("+14155552671"))
+
+    def test_garbage(self) -> None:
+        self.assertFalse(is_valid_phone_number("not a number"))